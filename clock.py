@@ -0,0 +1,87 @@
+# UDSIM/clock.py
+# Time source for everything timed in the simulator (timers, delays, rate
+# limits, recorder timestamps). The default is the wall clock; use_virtual()
+# switches to a virtual clock where sleep() does not block but advances time,
+# firing due timers in deadline order (see timers.advance). Together with the
+# loopback transport and a seed this makes runs instant and reproducible.
+import threading
+import time
+from contextlib import contextmanager
+
+class WallClock:
+    virtual = False
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def monotonic_ns(self) -> int:
+        return time.monotonic_ns()
+
+    def sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            time.sleep(seconds)
+
+class VirtualClock:
+    virtual = True
+
+    def __init__(self, start: float = 0.0):
+        self.now = start
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def monotonic_ns(self) -> int:
+        return int(self.now * 1e9)
+
+    def sleep(self, seconds: float) -> None:
+        if seconds <= 0:
+            return
+        deferred = getattr(_tls, "deferred", None)
+        if deferred is not None:
+            deferred[0] += seconds  # a deferred job only accumulates its run time
+            return
+        import timers  # timers imports clock
+        timers.advance(seconds)
+
+_clock = WallClock()
+_tls = threading.local()
+
+def monotonic() -> float:
+    return _clock.monotonic()
+
+def monotonic_ns() -> int:
+    return _clock.monotonic_ns()
+
+def sleep(seconds: float) -> None:
+    _clock.sleep(seconds)
+
+def current():
+    """The active clock object (VirtualClock exposes/accepts .now)."""
+    return _clock
+
+def is_virtual() -> bool:
+    return _clock.virtual
+
+def use_virtual(start: float = 0.0) -> VirtualClock:
+    """Switch to virtual time (call before arming any timer)."""
+    global _clock
+    _clock = VirtualClock(start)
+    return _clock
+
+def use_wall() -> None:
+    global _clock
+    _clock = WallClock()
+
+@contextmanager
+def deferred():
+    """
+    Virtual time only: sleeps on this thread add up in the yielded [seconds]
+    instead of advancing the clock, so the caller can schedule the result at
+    start + elapsed (see dispatcher's slow-service jobs).
+    """
+    elapsed = [0.0]
+    _tls.deferred = elapsed
+    try:
+        yield elapsed
+    finally:
+        _tls.deferred = None
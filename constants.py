@@ -5,6 +5,12 @@ VCAN_INTERFACE = "vcan0"
 ARB_ID_REQUEST = 0x7E0  # Tester → ECU
 ARB_ID_RESPONSE = 0x7E8  # ECU → Tester
 ARB_ID_FLAG = 0X7E8
+ARB_ID_FUNCTIONAL = 0x7DF  # Tester → all ECUs (functional addressing)
+
+# Session timing (milliseconds)
+P2_SERVER_MS = 50         # max time to first response
+P2_STAR_SERVER_MS = 5000  # max time after a ResponsePending (sent in 10 ms units)
+S3_SERVER_MS = 5000       # non-default session falls back to default without requests
 
 # 17 ASCII chars
 VIN = "Wh4t_4_W31rd_v1n_"
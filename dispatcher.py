@@ -1,88 +1,278 @@
 # UDSIM/dispatcher.py
-from constants import ARB_ID_REQUEST
-from services.session_control import handle_session_control
-from services.ecu_reset import handle_reset_response
-from services.read_data_by_id import handle_read_data_id
-from services.security_access import handle_security_access
+import importlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from constants import ARB_ID_FUNCTIONAL, P2_SERVER_MS, P2_STAR_SERVER_MS
+import clock
+import io_can
+import isotp
+import recorder
+import state
+import timers
 from services.negative_response import send_negative_response
-from services.clear_dtc import handle_clear_dtc
-from services.read_memory_by_address import handle_read_memory_by_address
 
-def handle_can_message(msg):
-    """Process incoming CAN messages and handle UDS requests"""
-    # Enforce tester -> ECU arbitration ID (0x7E0)
-    if msg.arbitration_id != ARB_ID_REQUEST:
-        # print(f"[IGNORE] Unexpected CAN ID 0x{msg.arbitration_id:X}; "
-              # f"expecting tester→ECU ID 0x{ARB_ID_REQUEST:X}")
-        return 0
+# SID -> (module, handler). Modules are imported on first use, so start-up only
+# pays for the services a tester actually calls.
+SERVICE_TABLE = {
+    0x10: ("services.session_control", "handle_session_control"),
+    0x11: ("services.ecu_reset", "handle_reset_response"),
+    0x14: ("services.clear_dtc", "handle_clear_dtc"),
+    0x19: ("services.read_dtc_information", "handle_read_dtc_information"),
+    0x22: ("services.read_data_by_id", "handle_read_data_id"),
+    0x23: ("services.read_memory_by_address", "handle_read_memory_by_address"),
+    0x27: ("services.security_access", "handle_security_access"),
+    0x31: ("services.routine_control", "handle_routine_control"),
+    0x3D: ("services.write_memory_by_address", "handle_write_memory_by_address"),
+    0x3E: ("services.tester_present", "handle_tester_present"),
+}
 
-    data = list(msg.data)
-    if len(data) < 2:
-        print("[WARNING] Message too short, missing PCI or service ID")
-        return
+_LOADED = {}  # (module, name) -> function
+
+# Services whose sub-function carries the suppressPosRspMsgIndicationBit
+SPRMIB_SERVICES = {0x10, 0x11, 0x31, 0x3E}
+SPRMIB = 0x80
+
+def _load(module, name):
+    """Import 'module' on first use and return its attribute 'name' (cached)."""
+    fn = _LOADED.get((module, name))
+    if fn is None:
+        fn = _LOADED[(module, name)] = getattr(importlib.import_module(module), name)
+    return fn
+
+def _handler(service_id):
+    return _load(*SERVICE_TABLE[service_id])
 
-    pci = data[0]
+# --- Worker pool for handlers that may take longer than P2_server ---
+# Enabled with enable_worker_pool(). Slow handlers then run on a worker thread
+# while the main loop keeps serving other testers; the tester gets
+# 0x7F SID 0x78 (requestCorrectlyReceived-ResponsePending) when P2 would
+# expire and again every P2* interval until the final response is sent.
+SLOW_SERVICES = {0x11}
+PENDING_MARGIN_MS = 10  # send 0x78 this much before the tester's P2/P2* runs out
 
-    if (pci & 0xF0) == 0x00:  # Single frame
-        data_length = pci & 0x0F
+_pool = None
+_busy = {}  # request arbitration ID -> _Job in progress
 
-        if len(data) < data_length + 1:
-            # print(f"[WARNING] Invalid message length. PCI indicates {data_length} bytes but got {len(data)-1}")
+class _Job:
+    __slots__ = ("service_id", "conn", "suppress", "lock", "done", "pending_sent", "timer")
+
+    def __init__(self, service_id, conn):
+        self.service_id = service_id
+        self.conn = conn
+        self.suppress = conn.suppress_pos_rsp
+        self.lock = threading.Lock()
+        self.done = False
+        self.pending_sent = False
+        self.timer = None
+
+def enable_worker_pool(max_workers=4):
+    """Run SLOW_SERVICES on a thread pool with automatic ResponsePending."""
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="udsim-worker")
+        print(f"[INFO] Slow services {', '.join(f'0x{sid:02X}' for sid in sorted(SLOW_SERVICES))} "
+              f"run on {max_workers} worker(s)")
+
+def forget_jobs():
+    """Drop in-progress slow-service jobs (their timers were cleared, they never finish)."""
+    _busy.clear()
+
+def _response_pending(job):
+    """Timer callback (main loop): keep the tester waiting until the worker is done."""
+    with job.lock:
+        if job.done:
             return
+        state.activate(job.conn)
+        send_negative_response(job.service_id, 0x78)
+        job.pending_sent = True
+        job.timer = timers.call_later((P2_STAR_SERVER_MS - PENDING_MARGIN_MS) / 1000.0,
+                                      _response_pending, job)
 
-        service_id = data[1]
-        print(f"[RECV] ID: 0x{msg.arbitration_id:X} PCI: 0x{pci:02X} Service: 0x{service_id:02X} Data: {[hex(b) for b in data]}")
+def _run_job(job, fn, args, kwargs):
+    """Worker thread: run the handler with its frames held back, then send them."""
+    state.activate(job.conn)
+    frames, failed = _capture_job(job, fn, args, kwargs)
+    _finish_job(job, frames, failed)
 
-        if service_id == 0x10:  # Diagnostic Session Control
-            print("[DEBUG] Processing Diagnostic Session Control request")
-            if data_length >= 2:
-                handle_session_control(data[2])
-            else:
-                send_negative_response(service_id, 0x13)
+def _run_job_virtual(job, fn, args, kwargs):
+    """
+    Virtual time: run the handler inline with its sleeps deferred, then deliver
+    its response when the virtual clock reaches start + elapsed, so pending
+    0x78 timers fire in the same order as they would on a worker.
+    """
+    with clock.deferred() as elapsed:
+        frames, failed = _capture_job(job, fn, args, kwargs)
+    timers.call_later(elapsed[0], _finish_job, job, frames, failed)
 
-        elif service_id == 0x11:  # ECU Reset
-            if data_length >= 2:
-                handle_reset_response(data[2])
-            else:
-                send_negative_response(service_id, 0x13)
+def _capture_job(job, fn, args, kwargs):
+    failed = False
+    with io_can.capture() as frames:
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            print(f"[ERROR] Service 0x{job.service_id:02X} failed: {e}")
+            failed = True
+    return frames, failed
 
-        elif service_id == 0x22:  # Read Data By ID
-            if data_length >= 3:
-                data_id = (data[2] << 8) | data[3]
-                print(f"[INFO] Read Data ID request: 0x{data_id:04X}")
-                handle_read_data_id(data_id)
-            else:
-                send_negative_response(service_id, 0x13)
-        
-        elif service_id == 0x14:  # ClearDiagnosticInformation
-            if data_length >= 4:  # SID + 3 group bytes
-                handle_clear_dtc(data[2:5])
-            else:
-                send_negative_response(service_id, 0x13)
-
-        elif service_id == 0x27:  # Security Access
-            if data_length >= 2:
-                subfunction = data[2]
-                if (subfunction % 2) == 0:
-                    # sendKey: forward exactly the remaining bytes after [SID, subfn]
-                    payload_len = max(0, data_length - 2)
-                    key_bytes = data[3:3 + payload_len]
-                    handle_security_access(subfunction, key_bytes)
-                else:
-                    # requestSeed: no payload
-                    handle_security_access(subfunction)
-            else:
-                send_negative_response(service_id, 0x13)
+def _finish_job(job, frames, failed):
+    with job.lock:
+        # Under the job lock so no 0x78 can follow the final response
+        job.done = True
+        job.timer.cancel()
+        state.activate(job.conn)
+        # A ResponsePending obliges us to send the final response even if suppressed
+        _send_frames(frames, job.suppress and not job.pending_sent)
+        if failed:
+            send_negative_response(job.service_id, 0x10)  # generalReject
+    _busy.pop(job.conn.request_id, None)
+
+def _send_frames(frames, suppress_positive):
+    """Send captured frames; with suppress_positive only negative responses go out."""
+    for arb_id, data in frames:
+        if suppress_positive and not (len(data) >= 2 and data[1] == 0x7F):
+            continue
+        io_can.send_can_frame(arb_id, data)
+
+def _call(service_id, conn, *args, **kwargs):
+    """Run the handler for service_id inline, or on the worker pool if it is slow."""
+    if conn.request_id in _busy:
+        send_negative_response(service_id, 0x21)  # busyRepeatRequest
+        return
+    fn = _handler(service_id)
+    if _pool is None or service_id not in SLOW_SERVICES:
+        if conn.suppress_pos_rsp:
+            with io_can.capture() as frames:
+                fn(*args, **kwargs)
+            _send_frames(frames, True)
+        else:
+            fn(*args, **kwargs)
+        return
+
+    job = _busy[conn.request_id] = _Job(service_id, conn)
+    job.timer = timers.call_later((P2_SERVER_MS - PENDING_MARGIN_MS) / 1000.0, _response_pending, job)
+    if clock.is_virtual():
+        _run_job_virtual(job, fn, args, kwargs)
+    else:
+        _pool.submit(_run_job, job, fn, args, kwargs)
+
+def _dispatch(conn, payload):
+    """Handle one complete UDS request (SID first) for the active connection."""
+    service_id = payload[0]
+    data_length = len(payload)
+    tester = conn.request_id
+
+    # Brute-force/flood protection: rejected before any logging or seed/key work
+    if service_id == 0x27 and _load("services.security_access", "reject_early")(tester):
+        return
+
+    print(f"[RECV] ID: 0x{tester:X}{' (functional)' if conn.functional else ''} "
+          f"Service: 0x{service_id:02X} Data: {[hex(b) for b in payload]}")
+
+    # suppressPosRspMsgIndicationBit: strip it from the sub-function, remember it for _call()
+    conn.suppress_pos_rsp = False
+    if service_id in SPRMIB_SERVICES and data_length >= 2 and payload[1] & SPRMIB:
+        conn.suppress_pos_rsp = True
+        payload = [service_id, payload[1] & 0x7F] + payload[2:]
 
-        elif service_id == 0x23:  # ReadMemoryByAddress
-            if data_length >= 2:
-                params = data[2: 1 + data_length]  # bytes after SID
-                handle_read_memory_by_address(params)
+    if service_id == 0x10:  # Diagnostic Session Control
+        print("[DEBUG] Processing Diagnostic Session Control request")
+        if data_length >= 2:
+            _call(0x10, conn, payload[1])
+        else:
+            send_negative_response(service_id, 0x13)
+
+    elif service_id == 0x3E:  # Tester Present
+        if data_length >= 2:
+            _call(0x3E, conn, payload[1])
+        else:
+            send_negative_response(service_id, 0x13)
+
+    elif service_id == 0x11:  # ECU Reset
+        if data_length >= 2:
+            _call(0x11, conn, payload[1])
+        else:
+            send_negative_response(service_id, 0x13)
+
+    elif service_id == 0x22:  # Read Data By ID
+        if data_length >= 3:
+            data_id = (payload[1] << 8) | payload[2]
+            print(f"[INFO] Read Data ID request: 0x{data_id:04X}")
+            _call(0x22, conn, data_id)
+        else:
+            send_negative_response(service_id, 0x13)
+
+    elif service_id == 0x14:  # ClearDiagnosticInformation
+        if data_length >= 4:  # SID + 3 group bytes
+            _call(0x14, conn, payload[1:4])
+        else:
+            send_negative_response(service_id, 0x13)
+
+    elif service_id == 0x19:  # ReadDTCInformation
+        if data_length >= 2:
+            _call(0x19, conn, payload[1:])
+        else:
+            send_negative_response(service_id, 0x13)
+
+    elif service_id == 0x27:  # Security Access
+        if data_length >= 2:
+            subfunction = payload[1]
+            if (subfunction % 2) == 0:
+                # sendKey: forward exactly the remaining bytes after [SID, subfn]
+                key_bytes = payload[2:]
+                _call(0x27, conn, subfunction, key_bytes, tester=tester)
             else:
-                send_negative_response(service_id, 0x13)
+                # requestSeed: no payload
+                _call(0x27, conn, subfunction, tester=tester)
+        else:
+            send_negative_response(service_id, 0x13)
+
+    elif service_id == 0x23:  # ReadMemoryByAddress
+        if data_length >= 2:
+            params = payload[1:]  # bytes after SID
+            _call(0x23, conn, params)
+        else:
+            send_negative_response(service_id, 0x13)
+
+    elif service_id == 0x31:  # RoutineControl
+        if data_length >= 2:
+            _call(0x31, conn, payload[1:])
+        else:
+            send_negative_response(service_id, 0x13)
 
+    elif service_id == 0x3D:  # WriteMemoryByAddress
+        if data_length >= 2:
+            _call(0x3D, conn, payload[1:])
         else:
-            send_negative_response(service_id, 0x11)
+            send_negative_response(service_id, 0x13)
+
     else:
-        print(f"[WARNING] Unsupported PCI format: 0x{pci:02X}")
-        # Multi-frame requests could be implemented here if needed
\ No newline at end of file
+        send_negative_response(service_id, 0x11)
+
+    # Any request keeps a non-default session alive
+    _load("services.session_control", "restart_s3")()
+
+def handle_can_message(msg):
+    """Process incoming CAN messages and handle UDS requests"""
+    recorder.record_rx(msg.arbitration_id, msg.data)
+
+    if msg.arbitration_id == ARB_ID_FUNCTIONAL:
+        # Functional request: Single Frame only, handled by every simulated ECU
+        payload = isotp.single_frame_payload(msg.data)
+        if not payload:
+            return
+        for conn in list(state.CONNECTIONS.values()):
+            state.activate(conn)
+            conn.functional = True
+            _dispatch(conn, payload)
+        return
+
+    # Physical request: only the request IDs of our connections (0x7E0, ...)
+    conn = state.CONNECTIONS.get(msg.arbitration_id)
+    if conn is None:
+        return 0
+
+    state.activate(conn)
+    payload = isotp.receive(conn, msg.data)
+    if payload:
+        conn.functional = False
+        _dispatch(conn, payload)
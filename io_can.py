@@ -1,6 +1,46 @@
 # UDSIM/io_can.py
+import fcntl
+import os
+import select
+import socket
+import struct
 import subprocess
+import threading
+from contextlib import contextmanager
 from constants import VCAN_INTERFACE
+import recorder
+
+# Where send_can_frame() puts frames. None = cansend on VCAN_INTERFACE.
+# Any callable(arb_id, data) can be installed with set_transport().
+_transport = None
+
+class LoopbackTransport:
+    """Collects sent frames in memory instead of putting them on the bus (replay, tests)."""
+    def __init__(self):
+        self.frames = []
+
+    def __call__(self, arb_id, data):
+        self.frames.append((arb_id, bytes(data)))
+
+def set_transport(transport):
+    """Install a frame sink; pass None to go back to cansend."""
+    global _transport
+    _transport = transport
+
+_tls = threading.local()
+
+@contextmanager
+def capture():
+    """
+    Collect the frames sent by the current thread instead of sending them; yields the
+    list of (arb_id, data). Used to hold back a worker's final response (see dispatcher).
+    """
+    frames = []
+    _tls.capture = frames
+    try:
+        yield frames
+    finally:
+        _tls.capture = None
 
 def setup_vcan():
     """Setup the virtual CAN (vcan) interface"""
@@ -20,6 +60,108 @@ def setup_vcan():
         print(f"[ERROR] Setup failed: {e}")
         return False
 
+# --- Fast start: interface checks/creation over ioctl + rtnetlink (no subprocesses) ---
+SIOCGIFFLAGS = 0x8913
+IFF_UP = 0x1
+RTM_NEWLINK = 16
+NLMSG_ERROR = 2
+NLM_F_REQUEST = 0x001
+NLM_F_ACK = 0x004
+NLM_F_EXCL = 0x200
+NLM_F_CREATE = 0x400
+IFLA_IFNAME = 3
+IFLA_LINKINFO = 18
+IFLA_INFO_KIND = 1
+
+_NLMSGHDR = struct.Struct("=IHHII")    # len, type, flags, seq, pid
+_IFINFOMSG = struct.Struct("=BxHiII")  # family, type, index, flags, change
+_RTATTR = struct.Struct("=HH")         # len, type
+
+def _rtattr(attr_type, payload):
+    length = _RTATTR.size + len(payload)
+    return _RTATTR.pack(length, attr_type) + payload + b"\0" * (-length % 4)
+
+def _rtnl_newlink(ifindex, flags, attrs=b""):
+    """Send one RTM_NEWLINK request and wait for the kernel's ack. Raises OSError on failure."""
+    body = _IFINFOMSG.pack(socket.AF_UNSPEC, 0, ifindex, IFF_UP, IFF_UP) + attrs
+    msg = _NLMSGHDR.pack(_NLMSGHDR.size + len(body), RTM_NEWLINK,
+                         NLM_F_REQUEST | NLM_F_ACK | flags, 1, 0) + body
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE) as nl:
+        nl.send(msg)
+        reply = nl.recv(4096)
+    _, msg_type, _, _, _ = _NLMSGHDR.unpack_from(reply)
+    if msg_type == NLMSG_ERROR:
+        (error,) = struct.unpack_from("=i", reply, _NLMSGHDR.size)
+        if error:
+            raise OSError(-error, os.strerror(-error))
+
+def _interface_is_up(name):
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        ifreq = fcntl.ioctl(s.fileno(), SIOCGIFFLAGS, struct.pack("16sH14x", name.encode(), 0))
+    (flags,) = struct.unpack_from("H", ifreq, 16)
+    return bool(flags & IFF_UP)
+
+def setup_vcan_fast():
+    """
+    Same result as setup_vcan() without spawning processes:
+      - existence/state checked with if_nametoindex() and SIOCGIFFLAGS
+      - missing interface created (and brought up) with one RTM_NEWLINK; the kernel
+        loads the vcan module on demand, so no modprobe is needed
+    Falls back to setup_vcan() if netlink is not permitted.
+    """
+    try:
+        try:
+            ifindex = socket.if_nametoindex(VCAN_INTERFACE)
+        except OSError:
+            ifindex = None
+
+        if ifindex is None:
+            linkinfo = _rtattr(IFLA_LINKINFO, _rtattr(IFLA_INFO_KIND, b"vcan"))
+            _rtnl_newlink(0, NLM_F_CREATE | NLM_F_EXCL,
+                          _rtattr(IFLA_IFNAME, VCAN_INTERFACE.encode() + b"\0") + linkinfo)
+            print(f"[SETUP] Created {VCAN_INTERFACE} via netlink")
+        elif not _interface_is_up(VCAN_INTERFACE):
+            _rtnl_newlink(ifindex, 0)
+        print(f"[SETUP] {VCAN_INTERFACE} is now configured and ready")
+        return True
+    except OSError as e:
+        print(f"[WARN] Netlink setup failed ({e}); falling back to ip/modprobe")
+        return setup_vcan()
+
+class RawCanMessage:
+    __slots__ = ("arbitration_id", "data")
+
+    def __init__(self, arbitration_id, data):
+        self.arbitration_id = arbitration_id
+        self.data = data
+
+class RawCanBus:
+    """
+    Minimal SocketCAN CAN_RAW bus on the stdlib socket module: recv()/send()/shutdown()
+    like python-can's Bus, without importing python-can (fast start).
+    """
+    _FRAME = struct.Struct("=IB3x8s")  # struct can_frame
+    _EFF_FLAG = 0x80000000
+    _ID_MASK = 0x1FFFFFFF
+
+    def __init__(self, channel):
+        self._sock = socket.socket(socket.PF_CAN, socket.SOCK_RAW, socket.CAN_RAW)
+        self._sock.bind((channel,))
+
+    def recv(self, timeout=None):
+        ready, _, _ = select.select([self._sock], [], [], timeout)
+        if not ready:
+            return None
+        can_id, dlc, data = self._FRAME.unpack(self._sock.recv(self._FRAME.size))
+        return RawCanMessage(can_id & self._ID_MASK, data[:dlc])
+
+    def send(self, arb_id, data):
+        data = bytes(data)
+        self._sock.send(self._FRAME.pack(arb_id, len(data), data.ljust(8, b"\0")))
+
+    def shutdown(self):
+        self._sock.close()
+
 def start_cangen():
     """Start the cangen tool to generate random CAN traffic"""
     try:
@@ -37,6 +179,14 @@ def start_cangen():
 
 def send_can_frame(arb_id, data):
     """Send a CAN frame with specified arbitration ID and data bytes"""
+    frames = getattr(_tls, "capture", None)
+    if frames is not None:
+        frames.append((arb_id, list(data)))
+        return True
+    recorder.record_tx(arb_id, data)
+    if _transport is not None:
+        _transport(arb_id, data)
+        return True
     try:
         data_hex = ''.join([f'{x:02X}' for x in data])
         frame = f"{arb_id:03X}#{data_hex}"
@@ -0,0 +1,142 @@
+# UDSIM/isotp.py
+# ISO-TP (ISO 15765-2) for classic CAN (8-byte frames).
+# Transmit: payloads can be streamed from an iterable of chunks so large
+# responses (e.g. thousands of DTC records) never have to be built as one list.
+# Receive: per-connection reassembly of multi-frame requests (state.Connection).
+import clock
+from typing import Iterable, List, Optional, Sequence
+
+from io_can import send_can_frame
+
+MAX_SF_DL = 7                # Single Frame payload
+MAX_FF_DL_12BIT = 0xFFF      # classic First Frame length field
+MAX_FF_DL_32BIT = 0xFFFFFFFF # escape sequence First Frame (ISO 15765-2:2016)
+
+MAX_REQUEST_LEN = MAX_FF_DL_12BIT  # longest request we reassemble
+FC_CONTINUE_TO_SEND = [0x30, 0x00, 0x00]  # BS=0 (no further FC), STmin=0
+FC_OVERFLOW = [0x32, 0x00, 0x00]
+
+def send_isotp(arb_id: int, payload: Sequence[int], cf_gap: float = 0.0) -> None:
+    """Send a complete UDS payload (SID first) as SF or FF+CFs."""
+    send_isotp_stream(arb_id, len(payload), [payload], cf_gap)
+
+def send_isotp_stream(arb_id: int, total: int, chunks: Iterable[Sequence[int]],
+                      cf_gap: float = 0.0) -> None:
+    """
+    Send a UDS payload of 'total' bytes produced lazily by 'chunks'.
+    - Single Frame if total <= 7
+    - Otherwise First Frame + Consecutive Frames (streams CFs; does not wait for FC)
+    - Payloads above 4095 bytes use the FF escape sequence (0x10 0x00 + 32-bit length)
+    """
+    if total > MAX_FF_DL_32BIT:
+        raise ValueError("UDS payload too large for ISO-TP")
+
+    it = iter(chunks)
+    buf = bytearray()
+    pos = 0
+
+    def take(n: int) -> bytearray:
+        nonlocal buf, pos
+        while len(buf) - pos < n:
+            chunk = next(it, None)
+            if chunk is None:
+                break
+            if pos:
+                del buf[:pos]  # compact before growing
+                pos = 0
+            buf.extend(chunk)
+        out = buf[pos:pos + n]
+        pos += len(out)
+        return out
+
+    if total <= MAX_SF_DL:
+        data = take(total)
+        send_can_frame(arb_id, [total] + list(data))
+        return
+
+    if total <= MAX_FF_DL_12BIT:
+        # FF: PCI = 0x10 | (length high nibble), then length low byte, then 6 bytes
+        header = [0x10 | ((total >> 8) & 0x0F), total & 0xFF]
+    else:
+        # FF escape: FF_DL = 0 in the 12-bit field, real length as 32-bit big-endian
+        header = [0x10, 0x00] + list(total.to_bytes(4, "big"))
+    first = take(8 - len(header))
+    send_can_frame(arb_id, header + list(first))
+    sent = len(first)
+
+    # Remaining bytes go in CF frames, 7 bytes per CF
+    sn = 1  # sequence number 1..15, then wraps to 0
+    while sent < total:
+        chunk = take(min(7, total - sent))
+        if not chunk:
+            raise ValueError(f"ISO-TP stream ended after {sent} of {total} bytes")
+        send_can_frame(arb_id, [0x20 | sn] + list(chunk))
+        sent += len(chunk)
+        sn = (sn + 1) & 0x0F
+        if cf_gap > 0:
+            clock.sleep(cf_gap)
+
+def single_frame_payload(data: Sequence[int]) -> Optional[List[int]]:
+    """UDS payload of a Single Frame, or None if 'data' is not a valid SF."""
+    if not data or (data[0] & 0xF0) != 0x00:
+        return None
+    length = data[0] & 0x0F
+    if length == 0 or len(data) < length + 1:
+        print(f"[WARNING] Invalid SF: PCI indicates {length} bytes but got {len(data) - 1}")
+        return None
+    return list(data[1:1 + length])
+
+def receive(conn, data: Sequence[int]) -> Optional[List[int]]:
+    """
+    Feed one physical request frame of 'conn'. Returns the complete UDS payload
+    (SF, or FF + CFs once the last CF arrived), None while more frames are needed.
+    Answers a FF with a Flow Control frame on the connection's response ID.
+    """
+    if len(data) < 2:
+        print("[WARNING] Message too short, missing PCI or service ID")
+        return None
+
+    pci_type = data[0] >> 4
+    if pci_type == 0x0:  # Single Frame
+        conn.rx_buffer = None
+        return single_frame_payload(data)
+
+    if pci_type == 0x1:  # First Frame
+        length = ((data[0] & 0x0F) << 8) | data[1]
+        first = data[2:8]
+        if length == 0:  # escape sequence: 32-bit length
+            length = int.from_bytes(bytes(data[2:6]), "big")
+            first = data[6:8]
+        if len(data) < 8 or length <= MAX_SF_DL:
+            print(f"[WARNING] Invalid FF (dlc={len(data)}, length={length})")
+            return None
+        if length > MAX_REQUEST_LEN:
+            conn.rx_buffer = None
+            send_can_frame(conn.response_id, FC_OVERFLOW)
+            return None
+        conn.rx_buffer = bytearray(first)
+        conn.rx_length = length
+        conn.rx_sn = 1
+        send_can_frame(conn.response_id, FC_CONTINUE_TO_SEND)
+        return None
+
+    if pci_type == 0x2:  # Consecutive Frame
+        if conn.rx_buffer is None:
+            return None  # no FF in progress: ignore
+        sn = data[0] & 0x0F
+        if sn != conn.rx_sn:
+            print(f"[WARNING] CF sequence error: got {sn}, expected {conn.rx_sn}; request dropped")
+            conn.rx_buffer = None
+            return None
+        remaining = conn.rx_length - len(conn.rx_buffer)
+        conn.rx_buffer += bytes(data[1:1 + min(7, remaining)])
+        conn.rx_sn = (sn + 1) & 0x0F
+        if len(conn.rx_buffer) < conn.rx_length:
+            return None
+        payload = list(conn.rx_buffer)
+        conn.rx_buffer = None
+        return payload
+
+    if pci_type != 0x3:  # Flow Control from the tester is ignored (we never wait for one)
+        print(f"[WARNING] Unsupported PCI format: 0x{data[0]:02X}")
+    return None
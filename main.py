@@ -1,28 +1,73 @@
 # UDSIM/main.py
+import argparse
 import sys
-import can
-from io_can import setup_vcan, start_cangen
-from constants import VCAN_INTERFACE
-from dispatcher import handle_can_message
+import time
+import io_can
+from io_can import setup_vcan, setup_vcan_fast, start_cangen
+from constants import VCAN_INTERFACE, ARB_ID_REQUEST, ARB_ID_RESPONSE
+from dispatcher import handle_can_message, enable_worker_pool
 from services.memstore import init_memory
+from services.dtc_store import init_dtcs
+import timers
+import recorder
+import state
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="UDS ECU simulator on SocketCAN")
+    parser.add_argument("--record", metavar="PATH",
+                        help="record every received/sent frame to a binary log (see replay.py)")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed for the memory image, DTC memory and security seeds/keys "
+                             "(pass the same to replay.py)")
+    parser.add_argument("--fast-start", action="store_true",
+                        help="netlink interface setup, raw CAN socket I/O and a cached memory image "
+                             "(cache needs --seed)")
+    parser.add_argument("--ecus", type=int, default=1, choices=range(1, 9), metavar="N",
+                        help="simulate N ECUs on 0x7E0+i / 0x7E8+i (1-8), each with its own "
+                             "session/security state; all of them answer functional requests (0x7DF)")
+    parser.add_argument("--workers", type=int, default=0, metavar="N",
+                        help="run slow services (ECUReset) on N worker threads, sending "
+                             "ResponsePending (NRC 0x78) until they finish")
+    return parser.parse_args()
 
 def main():
+    started = time.monotonic()
+    args = parse_args()
     print("[INFO] Starting UDS ECU simulation with PCI")
 
-    if not setup_vcan():
+    if not (setup_vcan_fast() if args.fast_start else setup_vcan()):
         print("[FATAL] Failed to setup vcan interface. Exiting.")
         return
 
     # Launch traffic generator (if your helper starts a subprocess/thread, consider adding a matching stop later)
-    init_memory(seed=None)
+    init_memory(seed=args.seed, use_cache=args.fast_start)
+    init_dtcs(seed=args.seed)
+    if args.seed is not None:
+        state.seed(args.seed)
     start_cangen()
+    if args.record:
+        recorder.start(args.record)
+    for i in range(1, args.ecus):
+        state.add_connection(ARB_ID_REQUEST + i, ARB_ID_RESPONSE + i)
+    if args.workers > 0:
+        enable_worker_pool(args.workers)
     
     bus = None
     try:
-        bus = can.interface.Bus(channel=VCAN_INTERFACE, bustype='socketcan')
-        print(f"[INFO] Listening for UDS requests on {VCAN_INTERFACE}... Press Ctrl+C to exit.")
+        if args.fast_start:
+            # Plain CAN_RAW socket: no python-can import, no cansend process per frame
+            bus = io_can.RawCanBus(VCAN_INTERFACE)
+            io_can.set_transport(bus.send)
+        else:
+            import can
+            bus = can.interface.Bus(channel=VCAN_INTERFACE, bustype='socketcan')
+        print(f"[INFO] Listening for UDS requests on {VCAN_INTERFACE} "
+              f"(ready after {(time.monotonic() - started) * 1000:.0f} ms)... Press Ctrl+C to exit.")
         while True:
-            msg = bus.recv(timeout=1.0)  # 1s timeout lets Ctrl+C be handled promptly
+            # Wake up for the next timer (S3, ...) or after 1s so Ctrl+C is handled promptly
+            msg = bus.recv(timeout=timers.next_timeout(1.0))
+            # Timers and worker hand-overs (e.g. an ECUReset) first, so the request sees their effect
+            timers.run_due()
             if msg is not None:
                 handle_can_message(msg)
 
@@ -35,10 +80,12 @@ def main():
     finally:
         if bus is not None:
             try:
+                io_can.set_transport(None)
                 bus.shutdown()
                 print("[INFO] CAN bus shutdown completed")
             except Exception as e:
                 print(f"[WARN] Error during CAN bus shutdown: {e}")
+        recorder.stop()
         # If start_cangen() creates a background process/thread, stop it here
         # e.g., stop_cangen()  # implement if needed
 
@@ -0,0 +1,98 @@
+# UDSIM/recorder.py
+# Append-only binary traffic log.
+#
+# File layout (little-endian):
+#   header : magic(8) "UDSREC01", record count (u64)
+#   record : monotonic timestamp ns (u64), direction (u8), arbitration ID (u32),
+#            DLC (u8), data (8 bytes, zero padded)            -> 22 bytes
+#
+# The file is memory-mapped and grown in GROW_BYTES steps, so recording a frame
+# is a struct.pack_into() into the mapping — no syscall per frame. The record
+# count in the header is updated after each record, so a log cut short by a
+# crash is still readable up to the last complete frame.
+import mmap
+import os
+import struct
+import threading
+from typing import Iterator, NamedTuple, Optional
+
+import clock
+
+MAGIC = b"UDSREC01"
+HEADER = struct.Struct("<8sQ")
+RECORD = struct.Struct("<QBIB8s")
+GROW_BYTES = 1 << 20
+
+DIR_RX = 0  # tester -> ECU (received by the simulator)
+DIR_TX = 1  # ECU -> tester (sent by the simulator)
+
+class Frame(NamedTuple):
+    t_ns: int
+    direction: int
+    arbitration_id: int
+    data: bytes
+
+class Recorder:
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.ftruncate(self._fd, GROW_BYTES)
+        self._mm = mmap.mmap(self._fd, GROW_BYTES)
+        self._lock = threading.Lock()
+        self._offset = HEADER.size
+        self.count = 0
+        HEADER.pack_into(self._mm, 0, MAGIC, 0)
+
+    def record(self, direction: int, arb_id: int, data) -> None:
+        data = bytes(data)
+        with self._lock:
+            if self._offset + RECORD.size > len(self._mm):
+                self._mm.resize(len(self._mm) + GROW_BYTES)
+            RECORD.pack_into(self._mm, self._offset, clock.monotonic_ns(), direction,
+                             arb_id, len(data), data)
+            self._offset += RECORD.size
+            self.count += 1
+            HEADER.pack_into(self._mm, 0, MAGIC, self.count)
+
+    def close(self) -> None:
+        with self._lock:
+            self._mm.flush()
+            self._mm.close()
+            os.ftruncate(self._fd, self._offset)  # drop the unused preallocated tail
+            os.close(self._fd)
+
+_active: Optional[Recorder] = None
+
+def start(path: str) -> Recorder:
+    """Record every frame passing through the dispatcher / io_can into 'path'."""
+    global _active
+    stop()
+    _active = Recorder(path)
+    print(f"[recorder] Recording traffic to {path}")
+    return _active
+
+def stop() -> None:
+    global _active
+    if _active is not None:
+        rec, _active = _active, None
+        rec.close()
+        print(f"[recorder] Wrote {rec.count} frames to {rec.path}")
+
+def record_rx(arb_id: int, data) -> None:
+    if _active is not None:
+        _active.record(DIR_RX, arb_id, data)
+
+def record_tx(arb_id: int, data) -> None:
+    if _active is not None:
+        _active.record(DIR_TX, arb_id, data)
+
+def read(path: str) -> Iterator[Frame]:
+    """Yield the frames of a log written by Recorder."""
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, count = HEADER.unpack_from(mm, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a UDSIM traffic log")
+            for i in range(count):
+                t_ns, direction, arb_id, dlc, data = RECORD.unpack_from(mm, HEADER.size + i * RECORD.size)
+                yield Frame(t_ns, direction, arb_id, data[:dlc])
@@ -0,0 +1,156 @@
+# UDSIM/replay.py
+# Feed a traffic log recorded with `main.py --record` back through the
+# dispatcher and diff the ECU responses against the recorded ones.
+#
+#   python replay.py traffic.udsrec              # as fast as possible
+#   python replay.py traffic.udsrec --realtime   # keep the original frame timing
+#   python replay.py traffic.udsrec --virtual-time --seed 1
+#                                                # original timing on a virtual clock:
+#                                                # timers fire as recorded, no waiting
+#   python replay.py traffic.udsrec --ecus 3     # log recorded with main.py --ecus 3
+#   python replay.py traffic.udsrec --workers 2 --seed 1
+#                                                # log recorded with main.py --workers 2
+#
+# A sent frame belongs to the latest received frame addressed to the same ECU
+# (its request ID, or 0x7DF), so delayed responses such as 0x78 + final answer
+# of a worker-pool job are compared with their request even when other
+# frames were received in between.
+import argparse
+import contextlib
+import os
+import time
+from typing import List, NamedTuple, Tuple
+
+import clock
+import io_can
+import recorder
+import state
+import timers
+from constants import ARB_ID_FUNCTIONAL, ARB_ID_REQUEST, ARB_ID_RESPONSE
+from dispatcher import enable_worker_pool, handle_can_message
+from services.memstore import init_memory
+from services.dtc_store import init_dtcs
+
+class _Msg(NamedTuple):
+    arbitration_id: int
+    data: bytes
+
+def _fmt(frame: Tuple[int, bytes]) -> str:
+    arb_id, data = frame
+    return f"{arb_id:03X}#{data.hex().upper()}"
+
+class _Grouper:
+    """Assigns sent frames to the step of the request they answer."""
+    def __init__(self):
+        self.owner = {}  # response ID -> index of the step it currently answers
+        self.last = -1
+
+    def received(self, index: int, arb_id: int) -> None:
+        self.last = index
+        if arb_id == ARB_ID_FUNCTIONAL:
+            for conn in state.CONNECTIONS.values():
+                self.owner[conn.response_id] = index
+        elif arb_id in state.CONNECTIONS:
+            self.owner[state.CONNECTIONS[arb_id].response_id] = index
+
+    def step_of(self, arb_id: int) -> int:
+        return self.owner.get(arb_id, self.last)
+
+def _steps(path: str):
+    """Group the log into (rx frame, [tx frames answering it])."""
+    steps: List[Tuple[recorder.Frame, List[Tuple[int, bytes]]]] = []
+    grouper = _Grouper()
+    for frame in recorder.read(path):
+        if frame.direction == recorder.DIR_RX:
+            grouper.received(len(steps), frame.arbitration_id)
+            steps.append((frame, []))
+        elif steps:
+            steps[grouper.step_of(frame.arbitration_id)][1].append((frame.arbitration_id, frame.data))
+    return steps
+
+def replay(path: str, realtime: bool = False, verbose: bool = False,
+           virtual_time: bool = False) -> int:
+    """Replay 'path'; returns the number of requests whose responses differ."""
+    steps = _steps(path)
+    if virtual_time:
+        clock.use_virtual()
+    got: List[List[Tuple[int, bytes]]] = [[] for _ in steps]
+    grouper = _Grouper()
+    io_can.set_transport(lambda arb_id, data: got[grouper.step_of(arb_id)].append((arb_id, bytes(data))))
+
+    start = time.perf_counter()
+    t0 = steps[0][0].t_ns if steps else 0
+    devnull = open(os.devnull, "w")
+    quiet = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(devnull)
+    try:
+        for i, (rx, _) in enumerate(steps):
+            if realtime:
+                wait = (rx.t_ns - t0) / 1e9 - (time.perf_counter() - start)
+                if wait > 0:
+                    time.sleep(wait)
+            with quiet:
+                if not virtual_time:
+                    # Like main.py: timers that fell due before this frame (S3, lockout) fire first
+                    timers.run_due()
+                grouper.received(i, rx.arbitration_id)
+                handle_can_message(_Msg(rx.arbitration_id, rx.data))
+                if not virtual_time:
+                    timers.run_due()  # hand-overs and zero-delay timers armed by the handler
+                elif i + 1 < len(steps):
+                    # Up to the next request, so timer frames (0x78, ...) fire as recorded
+                    timers.advance(max(0.0, (steps[i + 1][0].t_ns - t0) / 1e9 - clock.monotonic()))
+                else:
+                    timers.run_until_idle()
+    finally:
+        devnull.close()
+        io_can.set_transport(None)
+        if virtual_time:
+            timers.clear()
+            clock.use_wall()
+
+    mismatches = 0
+    for i, (rx, expected) in enumerate(steps):
+        if got[i] != expected:
+            mismatches += 1
+            print(f"[REPLAY] #{i} RX {_fmt((rx.arbitration_id, rx.data))}")
+            print(f"  expected: {' '.join(_fmt(f) for f in expected) or '-'}")
+            print(f"  got:      {' '.join(_fmt(f) for f in got[i]) or '-'}")
+
+    elapsed = time.perf_counter() - start
+    rate = len(steps) / elapsed if elapsed > 0 else float("inf")
+    print(f"[REPLAY] {len(steps)} received frames in {elapsed:.3f}s ({rate:.0f} frames/s), "
+          f"{mismatches} with different responses")
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a UDSIM traffic log and diff the responses")
+    parser.add_argument("log", help="file written by main.py --record")
+    parser.add_argument("--realtime", action="store_true", help="keep the recorded frame timing")
+    parser.add_argument("--virtual-time", action="store_true",
+                        help="keep the recorded timing on a virtual clock (no waiting)")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="memory/DTC/security seed the recording simulator was started with")
+    parser.add_argument("--ecus", type=int, default=1, choices=range(1, 9), metavar="N",
+                        help="the log was recorded with main.py --ecus N (0x7E0+i / 0x7E8+i)")
+    parser.add_argument("--workers", type=int, default=0, metavar="N",
+                        help="the log was recorded with main.py --workers N; implies --virtual-time "
+                             "so ResponsePending and the final response come at their recorded time")
+    parser.add_argument("-v", "--verbose", action="store_true", help="show the handlers' log output")
+    args = parser.parse_args()
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        init_memory(seed=args.seed)
+        init_dtcs(seed=args.seed)
+    if args.seed is not None:
+        state.seed(args.seed)
+    for i in range(1, args.ecus):
+        state.add_connection(ARB_ID_REQUEST + i, ARB_ID_RESPONSE + i)
+    if args.workers > 0:
+        if args.realtime:
+            parser.error("--workers replays on virtual time and cannot be combined with --realtime")
+        enable_worker_pool(args.workers)
+    virtual_time = args.virtual_time or args.workers > 0
+    raise SystemExit(1 if replay(args.log, args.realtime, args.verbose, virtual_time) else 0)
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,9 @@
 # UDSIM/services/clear_dtc.py
-from constants import ARB_ID_RESPONSE
 from io_can import send_can_frame
 from services.negative_response import send_negative_response
 from services.secrets_data import FLAG014_HEX
 from services.send_flag import send_flag
+from services.dtc_store import clear_group
 import state
 
 def handle_clear_dtc(params: list[int]) -> None:
@@ -15,6 +15,7 @@ def handle_clear_dtc(params: list[int]) -> None:
       - Only allowed after 0x27 auth in session 0x03 (state.security_granted_level == 0x03)
       - If groupOfDTC == 0xFFFFFF (clear ALL): send 0x54, then send a second response (configurable)
       - Else (specific DTC / specific group): send only 0x54
+    Matching DTCs are removed from services.dtc_store (see clear_group for group encoding).
     """
     # Gate: must be authenticated specifically in session 0x03
     if getattr(state, "security_granted_level", 0x00) < 0x03:
@@ -27,11 +28,12 @@ def handle_clear_dtc(params: list[int]) -> None:
         return
 
     group = ((params[0] & 0xFF) << 16) | ((params[1] & 0xFF) << 8) | (params[2] & 0xFF)
+    cleared = clear_group(group)
 
     # Always send the positive response for valid format
-    send_can_frame(ARB_ID_RESPONSE, [0x01, 0x54])
+    send_can_frame(state.response_id, [0x01, 0x54])
     send_flag(FLAG014_HEX)
-    print(f"[0x14] Clear DTCs request, group=0x{group:06X} -> sent 0x54")
+    print(f"[0x14] Clear DTCs request, group=0x{group:06X} -> cleared {cleared}, sent 0x54")
 
     # If it's "clear ALL" (0xFFFFFF), also send the extra response (you define the bytes)
     if group == 0xFFFFFF:
@@ -0,0 +1,184 @@
+# UDSIM/services/dtc_store.py
+# DTC memory of the simulated ECU.
+#
+# Besides the DTC -> status table, two indexes are kept up to date on every
+# change so that reports and clears only touch the DTCs they return/remove:
+#   - _BY_STATUS[s]: DTCs whose status byte is exactly s (256 buckets). A status
+#     mask selects whole buckets, so counting is O(256) and listing is
+#     O(256 + matches), independent of the table size.
+#   - _BY_GROUP[g]:  DTCs by group (high byte of the 3-byte DTC number).
+import random
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+MAX_DTCS = 100_000
+DEFAULT_DTC_COUNT = 64
+
+# Status bits supported by this ECU (ISO 14229-1 DTCStatusMask, all 8 bits)
+STATUS_AVAILABILITY_MASK = 0xFF
+GROUP_ALL = 0xFFFFFF
+
+# DTC -> status byte
+DTC_STATUS: Dict[int, int] = {}
+_BY_STATUS: List[Set[int]] = [set() for _ in range(256)]
+_BY_GROUP: Dict[int, Set[int]] = {}
+
+# DTC -> {recordNumber: record bytes}
+# snapshot record bytes = [numberOfIdentifiers, DID hi, DID lo, data..., ...]
+SNAPSHOTS: Dict[int, Dict[int, bytes]] = {}
+EXT_DATA: Dict[int, Dict[int, bytes]] = {}
+_snapshot_records = 0  # total number of snapshot records (for 0x19 0x03 length)
+
+_INITED = False
+
+def group_of(dtc: int) -> int:
+    """Group key of a DTC: its high byte. Requested as groupOfDTC 0xGG0000."""
+    return (dtc >> 16) & 0xFF
+
+@lru_cache(maxsize=256)
+def _statuses_matching(mask: int) -> Tuple[int, ...]:
+    mask &= STATUS_AVAILABILITY_MASK
+    return tuple(s for s in range(256) if s & mask)
+
+def add_dtc(dtc: int, status: int,
+            snapshots: Optional[Dict[int, bytes]] = None,
+            ext_data: Optional[Dict[int, bytes]] = None) -> None:
+    """Store (or update) a DTC with its status byte and optional records."""
+    global _snapshot_records
+    dtc &= 0xFFFFFF
+    if dtc not in DTC_STATUS and len(DTC_STATUS) >= MAX_DTCS:
+        raise ValueError(f"DTC store full ({MAX_DTCS} DTCs)")
+    set_status(dtc, status)
+    _BY_GROUP.setdefault(group_of(dtc), set()).add(dtc)
+    if snapshots:
+        _snapshot_records += len(snapshots) - len(SNAPSHOTS.get(dtc, ()))
+        SNAPSHOTS[dtc] = dict(snapshots)
+    if ext_data:
+        EXT_DATA[dtc] = dict(ext_data)
+
+def set_status(dtc: int, status: int) -> None:
+    """Change the status byte of a DTC, moving it to the right status bucket."""
+    old = DTC_STATUS.get(dtc)
+    if old is not None:
+        _BY_STATUS[old].discard(dtc)
+    status &= 0xFF
+    DTC_STATUS[dtc] = status
+    _BY_STATUS[status].add(dtc)
+
+def _remove(dtc: int) -> None:
+    global _snapshot_records
+    status = DTC_STATUS.pop(dtc)
+    _BY_STATUS[status].discard(dtc)
+    _snapshot_records -= len(SNAPSHOTS.pop(dtc, ()))
+    EXT_DATA.pop(dtc, None)
+
+def _clear_all() -> None:
+    global _snapshot_records
+    DTC_STATUS.clear()
+    for bucket in _BY_STATUS:
+        bucket.clear()
+    _BY_GROUP.clear()
+    SNAPSHOTS.clear()
+    EXT_DATA.clear()
+    _snapshot_records = 0
+
+def clear_group(group: int) -> int:
+    """
+    Clear DTC memory for a groupOfDTC (0x14). Returns the number of DTCs cleared.
+      - 0xFFFFFF: all DTCs
+      - a stored DTC number: that DTC only
+      - 0xGG0000: every DTC whose high byte is GG
+    """
+    if not _INITED:
+        init_dtcs()
+    group &= 0xFFFFFF
+    if group == GROUP_ALL:
+        cleared = len(DTC_STATUS)
+        _clear_all()
+        return cleared
+
+    if group in DTC_STATUS:
+        _remove(group)
+        members = _BY_GROUP.get(group_of(group))
+        if members is not None:
+            members.discard(group)
+        return 1
+
+    if group & 0xFFFF == 0:
+        members = _BY_GROUP.pop(group_of(group), set())
+        for dtc in members:
+            _remove(dtc)
+        return len(members)
+
+    return 0
+
+def count_by_status_mask(mask: int) -> int:
+    """Number of DTCs with (status & mask & availability) != 0; O(256)."""
+    if not _INITED:
+        init_dtcs()
+    return sum(len(_BY_STATUS[s]) for s in _statuses_matching(mask))
+
+def iter_by_status_mask(mask: int) -> Iterator[Tuple[int, int]]:
+    """Yield (dtc, status) for every DTC matching the status mask."""
+    if not _INITED:
+        init_dtcs()
+    for s in _statuses_matching(mask):
+        for dtc in _BY_STATUS[s]:
+            yield dtc, s
+
+def get_status(dtc: int) -> Optional[int]:
+    """Status byte of a stored DTC, or None."""
+    if not _INITED:
+        init_dtcs()
+    return DTC_STATUS.get(dtc & 0xFFFFFF)
+
+def count_all() -> int:
+    if not _INITED:
+        init_dtcs()
+    return len(DTC_STATUS)
+
+def iter_all() -> Iterator[Tuple[int, int]]:
+    if not _INITED:
+        init_dtcs()
+    return iter(DTC_STATUS.items())
+
+def snapshot_record_count() -> int:
+    if not _INITED:
+        init_dtcs()
+    return _snapshot_records
+
+def iter_snapshot_ids() -> Iterator[Tuple[int, int]]:
+    """Yield (dtc, recordNumber) for every stored snapshot record."""
+    if not _INITED:
+        init_dtcs()
+    for dtc, records in SNAPSHOTS.items():
+        for rec in records:
+            yield dtc, rec
+
+def init_dtcs(count: int = DEFAULT_DTC_COUNT, seed: int | None = None) -> None:
+    """Populate DTC memory with 'count' random DTCs (status, snapshot 0x01, ext data 0x01)."""
+    global _INITED
+    if _INITED:
+        return
+    if count > MAX_DTCS:
+        raise ValueError(f"At most {MAX_DTCS} DTCs are supported, got {count}")
+    _INITED = True
+    rng = random.Random(seed)
+    # testFailed|confirmed, confirmed, pending, pending|testFailedThisCycle, testNotCompleted...
+    statuses = (0x09, 0x08, 0x04, 0x24, 0x2F, 0x50)
+    while len(DTC_STATUS) < count:
+        dtc = rng.randrange(0x000001, 0xFFFFFF)
+        if dtc & 0xFFFF == 0 or dtc in DTC_STATUS:
+            continue  # 0xGG0000 is reserved to address a whole group
+        # Snapshot: 1 identifier, DID 0x0101 (e.g. engine speed), 2 data bytes
+        snapshot = bytes([0x01, 0x01, 0x01, rng.randrange(256), rng.randrange(256)])
+        occurrences = bytes([rng.randrange(1, 256)])
+        add_dtc(dtc, rng.choice(statuses), {0x01: snapshot}, {0x01: occurrences})
+    print(f"[dtc_store] Initialized {len(DTC_STATUS)} DTCs (seed={seed})")
+
+def reset_dtcs(count: int = DEFAULT_DTC_COUNT, seed: int | None = None) -> None:
+    """Drop DTC memory (including clears/changes) and populate it again."""
+    global _INITED
+    _clear_all()
+    _INITED = False
+    init_dtcs(count, seed)
@@ -1,12 +1,25 @@
 # UDSIM/services/ecu_reset.py
-import time
-from constants import ARB_ID_RESPONSE
+import clock
 from io_can import send_can_frame
 from services.negative_response import send_negative_response
 from services.send_flag import send_flag
 import state
+import timers
 from services.secrets_data import FLAG01101_HEX, FLAG01102_HEX, FLAG01103_HEX
 
+def _apply_restart(conn):
+    pages = len(conn.mem_pages)
+    conn.reset()
+    print(f"[INFO] ECU restarted: default session, security locked, {pages} written page(s) dropped")
+
+def _restart():
+    """
+    Every reset type restarts the ECU: power-on state and the unmodified memory image.
+    Applied on the main loop: with --workers this handler runs on a worker thread
+    while the main loop keeps using the connection (ISO-TP reassembly, ...).
+    """
+    timers.call_soon_threadsafe(_apply_restart, state.current())
+
 def handle_reset_response(reset_type):
     """Handle UDS ECU Reset service and send appropriate response"""
     if reset_type == 0x01:  # Hard reset
@@ -17,22 +30,25 @@ def handle_reset_response(reset_type):
             return
         
         print("[INFO] Processing Hard Reset request")
-        time.sleep(0.5)
-        send_can_frame(ARB_ID_RESPONSE, [0x02, 0x51, 0x01])
+        clock.sleep(0.5)
+        send_can_frame(state.response_id, [0x02, 0x51, 0x01])
         send_flag(FLAG01101_HEX)
+        _restart()
 
     elif reset_type == 0x02:  # Key Off/On reset
         print("[INFO] Processing Key Off/On Reset request")
-        time.sleep(0.5)
-        send_can_frame(ARB_ID_RESPONSE, [0x02, 0x51, 0x02])
+        clock.sleep(0.5)
+        send_can_frame(state.response_id, [0x02, 0x51, 0x02])
         send_flag(FLAG01102_HEX)
+        _restart()
 
 
     elif reset_type == 0x03:  # Soft reset
         print("[INFO] Processing Soft Reset request")
-        time.sleep(0.5)
-        send_can_frame(ARB_ID_RESPONSE, [0x02, 0x51, 0x03])
+        clock.sleep(0.5)
+        send_can_frame(state.response_id, [0x02, 0x51, 0x03])
         send_flag(FLAG01103_HEX)
+        _restart()
 
 
     else:
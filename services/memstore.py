@@ -1,14 +1,28 @@
 # UDSIM/services/memstore.py
+import hashlib
+import os
 import random
-from typing import Dict, List, Tuple
+import struct
+from typing import Dict, Iterator, List, Tuple
 
 from constants import VIN
 from services.secrets_data import S3CR3T1_HEX, S3CR3T2_HEX, FLAG023_HEX
+import state
 
-# Address -> Data byte
-MEM: Dict[int, int] = {}
+MEM_SIZE = 0x10000
+
+# Base image: address -> data byte. Never modified after init_memory();
+# writes (0x3D) go to the active connection's copy-on-write pages
+# (state.mem_pages: page index -> bytearray(PAGE_SIZE)), so an ECUReset
+# restores the image just by dropping those pages.
+MEM = bytearray(MEM_SIZE)
+PAGE_SIZE = 0x100
 _INITED = False
 
+# Precompiled images, one file per seed (see init_memory(use_cache=True))
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "udsim")
+_CACHE_MAGIC = b"UDSMEM01"
+
 # Where we ended up placing each blob (for debugging)
 PLACED: Dict[str, Tuple[int, int]] = {}  # name -> (start, length)
 
@@ -37,8 +51,7 @@ def _build_blobs() -> List[Tuple[str, bytes]]:
     return blobs
 
 def _fill_random_64k(rng: random.Random) -> None:
-    MEM.clear()
-    for addr in range(0x10000):
+    for addr in range(MEM_SIZE):
         MEM[addr] = rng.randrange(0, 256)
 
 def _place_non_overlapping(blobs: List[Tuple[str, bytes]], rng: random.Random) -> None:
@@ -68,8 +81,7 @@ def _place_non_overlapping(blobs: List[Tuple[str, bytes]], rng: random.Random) -
         for at in candidates:
             if fits(at, L):
                 # Write bytes and record
-                for i, b in enumerate(blob):
-                    MEM[at + i] = b
+                MEM[at:at + L] = blob
                 mark(at, L)
                 PLACED[name] = (at, L)
                 print(f"[memstore] Placed {name} at 0x{at:04X}..0x{at+L-1:04X} (len={L})")
@@ -78,24 +90,154 @@ def _place_non_overlapping(blobs: List[Tuple[str, bytes]], rng: random.Random) -
         if not placed:
             raise RuntimeError(f"Could not place blob {name} (len={L}) without overlap")
 
-def init_memory(seed: int | None = None) -> None:
-    """Create 64 KiB random map, then randomly place VIN_PADDED + s3cr3t1 + s3cr3t2 + flag023."""
+def _cache_path(seed: int) -> str:
+    """Cache file for a seed; the name also hashes the blobs so edited secrets invalidate it."""
+    key = hashlib.sha256("|".join([VIN, S3CR3T1_HEX, S3CR3T2_HEX, FLAG023_HEX]).encode()).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, f"mem-{seed}-{key}.bin")
+
+def _load_cached(path: str) -> bool:
+    """Load MEM + PLACED from a cache file; False if missing or unusable."""
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+    except OSError:
+        return False
+    if raw[:8] != _CACHE_MAGIC:
+        return False
+    p = 8
+    placed = {}
+    try:
+        for _ in range(raw[p]):
+            name_len = raw[p + 1]
+            name = raw[p + 2:p + 2 + name_len].decode("ascii")
+            start, length = struct.unpack_from(">HH", raw, p + 2 + name_len)
+            placed[name] = (start, length)
+            p += 1 + name_len + 4
+    except (IndexError, struct.error, UnicodeDecodeError):
+        return False  # truncated/corrupt: init_memory rebuilds and rewrites it
+    p += 1
+    if len(raw) - p != MEM_SIZE:
+        return False
+    MEM[:] = raw[p:]
+    PLACED.clear()
+    PLACED.update(placed)
+    return True
+
+def _save_cached(path: str) -> None:
+    out = bytearray(_CACHE_MAGIC)
+    out.append(len(PLACED))
+    for name, (start, length) in PLACED.items():
+        out += bytes([len(name)]) + name.encode("ascii") + struct.pack(">HH", start, length)
+    out += MEM
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(out)
+        os.replace(tmp, path)  # atomic: concurrent starts never see a partial file
+    except OSError as e:
+        print(f"[memstore] Could not write image cache {path}: {e}")
+
+def init_memory(seed: int | None = None, use_cache: bool = False) -> None:
+    """
+    Create 64 KiB random map, then randomly place VIN_PADDED + s3cr3t1 + s3cr3t2 + flag023.
+    With use_cache and a seed, the finished image is loaded from / saved to CACHE_DIR,
+    skipping the hex parsing and the random fill/placement on later starts.
+    """
     global _INITED
     if _INITED:
         return
+    path = _cache_path(seed) if (use_cache and seed is not None) else None
+    if path is not None and _load_cached(path):
+        _INITED = True
+        print(f"[memstore] Loaded cached 64 KiB image (seed={seed}) from {path}")
+        return
+
     rng = random.Random(seed)
     blobs = _build_blobs()
     _fill_random_64k(rng)
     _place_non_overlapping(blobs, rng)
     _INITED = True
     print(f"[memstore] Initialized 64 KiB (seed={seed}); placed: {', '.join(PLACED.keys())}")
+    if path is not None:
+        _save_cached(path)
+
+def reset_memory(seed: int | None = None) -> None:
+    """Rebuild the base image from 'seed', whatever init_memory() built before."""
+    global _INITED
+    _INITED = False
+    PLACED.clear()
+    init_memory(seed)
 
 def get_bytes(address: int, size: int) -> List[int]:
     """Return 'size' bytes starting at 'address' (wrap around 0xFFFF->0x0000)."""
     if not _INITED:
         init_memory()
+    pages = state.mem_pages
     out = []
     a = address & 0xFFFF
-    for i in range(size):
-        out.append(MEM[(a + i) & 0xFFFF])
+    while size > 0:
+        if pages:
+            # Never cross a page boundary: each page may come from the overlay
+            offset = a % PAGE_SIZE
+            n = min(size, PAGE_SIZE - offset)
+            page = pages.get(a // PAGE_SIZE)
+            out += page[offset:offset + n] if page is not None else MEM[a:a + n]
+        else:
+            n = min(size, MEM_SIZE - a)
+            out += MEM[a:a + n]
+        size -= n
+        a = (a + n) & 0xFFFF
     return out
+
+def write_bytes(address: int, data) -> None:
+    """Write 'data' at 'address' (wrapping) into copy-on-write pages of the active connection."""
+    if not _INITED:
+        init_memory()
+    pages = state.mem_pages
+    a = address & 0xFFFF
+    p = 0
+    while p < len(data):
+        index, offset = divmod(a, PAGE_SIZE)
+        n = min(len(data) - p, PAGE_SIZE - offset)
+        page = pages.get(index)
+        if page is None:
+            base = index * PAGE_SIZE
+            page = pages[index] = bytearray(MEM[base:base + PAGE_SIZE])
+        page[offset:offset + n] = bytes(data[p:p + n])
+        p += n
+        a = (a + n) & 0xFFFF
+
+def iter_views(address: int, size: int) -> Iterator[memoryview]:
+    """
+    Yield zero-copy views covering 'size' bytes from 'address' (wrapping) as seen by
+    the active connection: runs of the base image, split only at written pages.
+    Pages are looked up lazily, so a consumer may interleave other requests.
+    """
+    if not _INITED:
+        init_memory()
+    base = memoryview(MEM)
+    a = address & 0xFFFF
+    while size > 0:
+        end = a + min(size, MEM_SIZE - a)
+        p = a
+        while p < end:
+            pages = state.mem_pages
+            index, offset = divmod(p, PAGE_SIZE)
+            page = pages.get(index)
+            if page is not None:
+                n = min(end - p, PAGE_SIZE - offset)
+                yield memoryview(page)[offset:offset + n]
+            else:
+                q = (index + 1) * PAGE_SIZE  # extend over following unwritten pages
+                while q < end and (q // PAGE_SIZE) not in pages:
+                    q += PAGE_SIZE
+                n = min(end, q) - p
+                yield base[p:p + n]
+            p += n
+        size -= end - a
+        a = 0
+
+def written_pages() -> int:
+    """Number of pages the active connection has written since power-on/reset."""
+    return len(state.mem_pages)
@@ -1,9 +1,16 @@
 # UDSIM/services/negative_response.py
-from constants import ARB_ID_RESPONSE
 from io_can import send_can_frame
+import state
+
+# NRCs an ECU must not send for functionally addressed requests (ISO 14229-1):
+# serviceNotSupported, subFunctionNotSupported, requestOutOfRange and the
+# "... in active session" variants
+FUNCTIONAL_SUPPRESSED_NRCS = (0x11, 0x12, 0x31, 0x7E, 0x7F)
 
 def send_negative_response(service_id, error_code):
     """Send a UDS negative response with proper PCI"""
+    if state.functional and error_code in FUNCTIONAL_SUPPRESSED_NRCS:
+        return
     # PCI byte (0x03 = length 3 bytes following) + Negative Response (0x7F) + Service ID + Error Code
-    send_can_frame(ARB_ID_RESPONSE, [0x03, 0x7F, service_id, error_code])
+    send_can_frame(state.response_id, [0x03, 0x7F, service_id, error_code])
     print(f"[RESPONSE] Negative response for service 0x{service_id:02X}: Error 0x{error_code:02X}")
@@ -1,6 +1,6 @@
 # UDSIM/services/read_data_by_id.py
-import time
-from constants import ARB_ID_RESPONSE, VIN
+import clock
+from constants import VIN
 from io_can import send_can_frame
 from services.negative_response import send_negative_response
 import state
@@ -20,12 +20,12 @@ def handle_read_data_id(data_id):
 
         payload = [0x62, 0xF1, 0x90] + list(VIN.encode("ascii"))  # total = 3 + 17 = 20 bytes
         # First Frame (FF): 0x10, total-length (0x14), then 6 bytes
-        send_can_frame(ARB_ID_RESPONSE, [0x10, 0x14] + payload[:6])
-        time.sleep(0.1)
+        send_can_frame(state.response_id, [0x10, 0x14] + payload[:6])
+        clock.sleep(0.1)
         # Consecutive Frames
-        send_can_frame(ARB_ID_RESPONSE, [0x21] + payload[6:13])
-        time.sleep(0.1)
-        send_can_frame(ARB_ID_RESPONSE, [0x22] + payload[13:20])
+        send_can_frame(state.response_id, [0x21] + payload[6:13])
+        clock.sleep(0.1)
+        send_can_frame(state.response_id, [0x22] + payload[13:20])
 
     else:
         print(f"[WARNING] Invalid data ID: 0x{data_id:04X}")
@@ -0,0 +1,143 @@
+# UDSIM/services/read_dtc_information.py
+from typing import Iterator, List
+
+from isotp import send_isotp, send_isotp_stream
+from services.negative_response import send_negative_response
+from services import dtc_store
+import state
+
+SERVICE_ID   = 0x19
+POS_RESP_SID = 0x59
+
+# Sub-functions
+REPORT_NUMBER_OF_DTC_BY_STATUS_MASK      = 0x01
+REPORT_DTC_BY_STATUS_MASK                = 0x02
+REPORT_DTC_SNAPSHOT_IDENTIFICATION       = 0x03
+REPORT_DTC_SNAPSHOT_RECORD_BY_DTC_NUMBER = 0x04
+REPORT_DTC_EXT_DATA_RECORD_BY_DTC_NUMBER = 0x06
+REPORT_SUPPORTED_DTC                     = 0x0A
+
+DTC_FORMAT_ISO14229_1 = 0x01
+ALL_RECORDS = 0xFF
+# DTCCount is 2 bytes; the store holds up to dtc_store.MAX_DTCS, so 0x01 saturates here
+MAX_DTC_COUNT = 0xFFFF
+
+# NRC constants
+NRC_SUBFUNCTION_NOT_SUPPORTED = 0x12
+NRC_INCORRECT_MESSAGE_LENGTH  = 0x13
+NRC_REQUEST_OUT_OF_RANGE      = 0x31
+
+def _dtc_bytes(dtc: int) -> List[int]:
+    return [(dtc >> 16) & 0xFF, (dtc >> 8) & 0xFF, dtc & 0xFF]
+
+def _dtc_and_status_records(items) -> Iterator[List[int]]:
+    for dtc, status in items:
+        yield _dtc_bytes(dtc) + [status]
+
+def _chain(header: List[int], records: Iterator[List[int]]) -> Iterator[List[int]]:
+    yield header
+    yield from records
+
+def _report_by_status_mask(subfunction: int, mask: int) -> None:
+    """59 02 availMask {DTC(3) status}* — streamed, never built as one list."""
+    count = dtc_store.count_by_status_mask(mask)
+    header = [POS_RESP_SID, subfunction, dtc_store.STATUS_AVAILABILITY_MASK]
+    send_isotp_stream(state.response_id, len(header) + 4 * count,
+                      _chain(header, _dtc_and_status_records(dtc_store.iter_by_status_mask(mask))))
+    print(f"[0x19] reportDTCByStatusMask mask=0x{mask:02X} -> {count} DTC(s)")
+
+def _report_supported(subfunction: int) -> None:
+    count = dtc_store.count_all()
+    header = [POS_RESP_SID, subfunction, dtc_store.STATUS_AVAILABILITY_MASK]
+    send_isotp_stream(state.response_id, len(header) + 4 * count,
+                      _chain(header, _dtc_and_status_records(dtc_store.iter_all())))
+    print(f"[0x19] reportSupportedDTC -> {count} DTC(s)")
+
+def _report_snapshot_ids(subfunction: int) -> None:
+    count = dtc_store.snapshot_record_count()
+    records = (_dtc_bytes(dtc) + [rec] for dtc, rec in dtc_store.iter_snapshot_ids())
+    send_isotp_stream(state.response_id, 2 + 4 * count, _chain([POS_RESP_SID, subfunction], records))
+    print(f"[0x19] reportDTCSnapshotIdentification -> {count} record(s)")
+
+def _report_records_by_dtc(subfunction: int, dtc: int, record: int, table) -> None:
+    """59 04/06 DTC(3) status {recordNumber record...}*"""
+    status = dtc_store.get_status(dtc)
+    if status is None:
+        send_negative_response(SERVICE_ID, NRC_REQUEST_OUT_OF_RANGE)
+        return
+    records = table.get(dtc, {})
+    if record == ALL_RECORDS:
+        selected = sorted(records.items())
+    elif record in records:
+        selected = [(record, records[record])]
+    else:
+        send_negative_response(SERVICE_ID, NRC_REQUEST_OUT_OF_RANGE)
+        return
+
+    payload = [POS_RESP_SID, subfunction] + _dtc_bytes(dtc) + [status]
+    for number, data in selected:
+        payload += [number] + list(data)
+    send_isotp(state.response_id, payload)
+    print(f"[0x19] sub=0x{subfunction:02X} DTC=0x{dtc:06X} record=0x{record:02X} "
+          f"-> {len(selected)} record(s)")
+
+def handle_read_dtc_information(params: list[int]) -> None:
+    """
+    UDS 0x19 ReadDTCInformation.
+    params: payload bytes AFTER the service id (starts with the sub-function).
+      - 0x01 reportNumberOfDTCByStatusMask       (mask)           -> 59 01 avail fmt countHi countLo
+                                                                     (count capped at 0xFFFF)
+      - 0x02 reportDTCByStatusMask               (mask)           -> 59 02 avail {DTC status}*
+      - 0x03 reportDTCSnapshotIdentification     ()               -> 59 03 {DTC recNum}*
+      - 0x04 reportDTCSnapshotRecordByDTCNumber  (DTC(3) recNum)  -> 59 04 DTC status {recNum snapshot}*
+      - 0x06 reportDTCExtDataRecordByDTCNumber   (DTC(3) recNum)  -> 59 06 DTC status {recNum data}*
+      - 0x0A reportSupportedDTC                  ()               -> 59 0A avail {DTC status}*
+    A report cannot be suppressed: with the suppressPosRsp bit (0x80) set the
+    sub-function is not supported (NRC 0x12).
+    """
+    if not params:
+        send_negative_response(SERVICE_ID, NRC_INCORRECT_MESSAGE_LENGTH)
+        return
+
+    subfunction = params[0]
+    args = params[1:]
+
+    if subfunction == REPORT_NUMBER_OF_DTC_BY_STATUS_MASK:
+        if len(args) != 1:
+            send_negative_response(SERVICE_ID, NRC_INCORRECT_MESSAGE_LENGTH)
+            return
+        count = min(dtc_store.count_by_status_mask(args[0]), MAX_DTC_COUNT)
+        send_isotp(state.response_id, [POS_RESP_SID, subfunction, dtc_store.STATUS_AVAILABILITY_MASK,
+                                     DTC_FORMAT_ISO14229_1, (count >> 8) & 0xFF, count & 0xFF])
+        print(f"[0x19] reportNumberOfDTCByStatusMask mask=0x{args[0]:02X} -> {count}")
+
+    elif subfunction == REPORT_DTC_BY_STATUS_MASK:
+        if len(args) != 1:
+            send_negative_response(SERVICE_ID, NRC_INCORRECT_MESSAGE_LENGTH)
+            return
+        _report_by_status_mask(subfunction, args[0])
+
+    elif subfunction == REPORT_DTC_SNAPSHOT_IDENTIFICATION:
+        if args:
+            send_negative_response(SERVICE_ID, NRC_INCORRECT_MESSAGE_LENGTH)
+            return
+        _report_snapshot_ids(subfunction)
+
+    elif subfunction in (REPORT_DTC_SNAPSHOT_RECORD_BY_DTC_NUMBER,
+                         REPORT_DTC_EXT_DATA_RECORD_BY_DTC_NUMBER):
+        if len(args) != 4:
+            send_negative_response(SERVICE_ID, NRC_INCORRECT_MESSAGE_LENGTH)
+            return
+        dtc = (args[0] << 16) | (args[1] << 8) | args[2]
+        table = (dtc_store.SNAPSHOTS if subfunction == REPORT_DTC_SNAPSHOT_RECORD_BY_DTC_NUMBER
+                 else dtc_store.EXT_DATA)
+        _report_records_by_dtc(subfunction, dtc, args[3], table)
+
+    elif subfunction == REPORT_SUPPORTED_DTC:
+        if args:
+            send_negative_response(SERVICE_ID, NRC_INCORRECT_MESSAGE_LENGTH)
+            return
+        _report_supported(subfunction)
+
+    else:
+        send_negative_response(SERVICE_ID, NRC_SUBFUNCTION_NOT_SUPPORTED)
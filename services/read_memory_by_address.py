@@ -1,11 +1,9 @@
 # UDSIM/services/read_memory_by_address.py
 from __future__ import annotations
 
-import time
 from typing import List
 
-from constants import ARB_ID_RESPONSE
-from io_can import send_can_frame
+from isotp import send_isotp
 from services.negative_response import send_negative_response
 from services.memstore import init_memory, get_bytes
 import state
@@ -35,39 +33,7 @@ def _send_isotp_positiveResponse(data: List[int]) -> None:
     - Single Frame if len(payload) <= 7
     - Otherwise First Frame + Consecutive Frames (streams CFs; does not wait for FC)
     """
-    # Build UDS payload first
-    uds = [POS_RESP_SID] + data
-    total = len(uds)
-
-    if total <= 7:
-        # SF: [len][UDS...]
-        frame = [total] + uds
-        send_can_frame(ARB_ID_RESPONSE, frame)
-        return
-
-    # --- Multi-frame transmit path (classic CAN, 8-byte frames) ---
-    # First Frame: PCI = 0x10 | (length high nibble), then length low byte,
-    # followed by first 6 bytes of UDS payload.
-    if total > 0xFFF:  # ISO-TP classic max length (12-bit)
-        # (should not happen if caller enforces MAX_DATA_PER_MSG)
-        raise ValueError("UDS payload too large for ISO-TP classic")
-
-    ff_pci0 = 0x10 | ((total >> 8) & 0x0F)
-    ff_pci1 = total & 0xFF
-    first_data = uds[:6]
-    send_can_frame(ARB_ID_RESPONSE, [ff_pci0, ff_pci1] + first_data)
-
-    # Remaining bytes go in CF frames, 7 bytes per CF
-    remaining = uds[6:]
-    sn = 1  # sequence number 1..15 wraps
-    while remaining:
-        chunk = remaining[:7]
-        remaining = remaining[7:]
-        pci = 0x20 | (sn & 0x0F)  # CF with sequence number
-        send_can_frame(ARB_ID_RESPONSE, [pci] + chunk)
-        sn = 1 if sn == 15 else sn + 1
-        if CF_GAP > 0:
-            time.sleep(CF_GAP)
+    send_isotp(state.response_id, [POS_RESP_SID] + data, cf_gap=CF_GAP)
 
 def handle_read_memory_by_address(params: list[int]) -> None:
     """
@@ -0,0 +1,154 @@
+# UDSIM/services/routine_control.py
+from __future__ import annotations
+
+import zlib
+
+from isotp import send_isotp
+from services.negative_response import send_negative_response
+from services import memstore
+import state
+import timers
+
+SERVICE_ID   = 0x31
+POS_RESP_SID = 0x71
+
+# Sub-functions
+START_ROUTINE           = 0x01
+STOP_ROUTINE            = 0x02
+REQUEST_ROUTINE_RESULTS = 0x03
+
+# Routine identifiers
+RID_CHECK_MEMORY = 0x0202  # CRC32 over memory: optionRecord = ALFID + address + size
+
+# routineStatus byte in requestResults responses
+STATUS_COMPLETED = 0x00
+STATUS_RUNNING   = 0x01
+STATUS_STOPPED   = 0x02
+
+# NRC constants
+NRC_SUBFUNCTION_NOT_SUPPORTED = 0x12
+NRC_INCORRECT_MESSAGE_LENGTH  = 0x13
+NRC_REQUEST_SEQUENCE_ERROR    = 0x24
+NRC_REQUEST_OUT_OF_RANGE      = 0x31
+NRC_SECURITY_ACCESS_DENIED    = 0x33
+
+# Bytes checksummed per main-loop tick; between ticks other requests are served
+CHUNK_SIZE = 4096
+
+class _ChecksumRoutine:
+    """CRC32 (zlib) over a memory range, advanced CHUNK_SIZE bytes per timer tick."""
+
+    def __init__(self, conn, address: int, size: int):
+        self.conn = conn
+        self.address = address
+        self.size = size
+        self.crc = 0
+        self.status = STATUS_RUNNING
+        self._views = memstore.iter_views(address, size)
+        self._view = memoryview(b"")
+        self._timer = timers.call_later(0, self._step)
+
+    def _step(self) -> None:
+        if self.conn.routines.get(RID_CHECK_MEMORY) is not self:
+            return  # replaced, or dropped by an ECUReset
+        state.activate(self.conn)
+        budget = CHUNK_SIZE
+        while budget > 0:
+            if not len(self._view):
+                view = next(self._views, None)
+                if view is None:
+                    self.status = STATUS_COMPLETED
+                    print(f"[0x31] CRC32 0x{self.address:X}+{self.size} = 0x{self.crc:08X}")
+                    return
+                self._view = view
+            part = self._view[:budget]
+            self.crc = zlib.crc32(part, self.crc)
+            self._view = self._view[len(part):]
+            budget -= len(part)
+        self._timer = timers.call_later(0, self._step)
+
+    def stop(self) -> None:
+        self._timer.cancel()
+        self.status = STATUS_STOPPED
+
+    def results(self) -> list[int]:
+        if self.status == STATUS_COMPLETED:
+            return [self.status] + list(self.crc.to_bytes(4, "big"))
+        return [self.status]
+
+def _parse_memory_range(option: list[int]):
+    """ALFID + address + size (as in 0x23) -> (address, size) or an NRC."""
+    if not option:
+        return NRC_INCORRECT_MESSAGE_LENGTH
+    size_len = (option[0] >> 4) & 0x0F
+    addr_len = option[0] & 0x0F
+    if size_len == 0 or addr_len == 0 or len(option) != 1 + addr_len + size_len:
+        return NRC_INCORRECT_MESSAGE_LENGTH
+    address = int.from_bytes(bytes(option[1:1 + addr_len]), "big")
+    size = int.from_bytes(bytes(option[1 + addr_len:]), "big")
+    if size == 0 or size > memstore.MEM_SIZE:
+        return NRC_REQUEST_OUT_OF_RANGE
+    return address, size
+
+def handle_routine_control(params: list[int]) -> None:
+    """
+    UDS 0x31 RoutineControl.
+    params: payload bytes AFTER the service id: sub-function, RID (2 bytes), optionRecord.
+      - 0x01 start  0x0202 ALFID addr size -> 71 01 02 02          (CRC runs in the background)
+      - 0x02 stop   0x0202                 -> 71 02 02 02
+      - 0x03 result 0x0202                 -> 71 03 02 02 status [CRC32 (4 bytes) when completed]
+    Same security level as ReadMemoryByAddress, since a CRC reveals memory contents.
+    """
+    if getattr(state, "security_granted_level", 0) != 0x04:
+        send_negative_response(SERVICE_ID, NRC_SECURITY_ACCESS_DENIED)
+        return
+
+    if len(params) < 3:
+        send_negative_response(SERVICE_ID, NRC_INCORRECT_MESSAGE_LENGTH)
+        return
+
+    subfunction = params[0] & 0x7F
+    rid = (params[1] << 8) | params[2]
+    option = params[3:]
+
+    if subfunction not in (START_ROUTINE, STOP_ROUTINE, REQUEST_ROUTINE_RESULTS):
+        send_negative_response(SERVICE_ID, NRC_SUBFUNCTION_NOT_SUPPORTED)
+        return
+    if rid != RID_CHECK_MEMORY:
+        send_negative_response(SERVICE_ID, NRC_REQUEST_OUT_OF_RANGE)
+        return
+
+    routine = state.routines.get(rid)
+    response = [POS_RESP_SID, subfunction, params[1], params[2]]
+
+    if subfunction == START_ROUTINE:
+        if routine is not None and routine.status == STATUS_RUNNING:
+            send_negative_response(SERVICE_ID, NRC_REQUEST_SEQUENCE_ERROR)
+            return
+        parsed = _parse_memory_range(option)
+        if isinstance(parsed, int):
+            send_negative_response(SERVICE_ID, parsed)
+            return
+        address, size = parsed
+        state.routines[rid] = _ChecksumRoutine(state.current(), address, size)
+        print(f"[0x31] Started CRC32 over 0x{address:X}+{size}")
+
+    elif subfunction == STOP_ROUTINE:
+        if option:
+            send_negative_response(SERVICE_ID, NRC_INCORRECT_MESSAGE_LENGTH)
+            return
+        if routine is None or routine.status != STATUS_RUNNING:
+            send_negative_response(SERVICE_ID, NRC_REQUEST_SEQUENCE_ERROR)
+            return
+        routine.stop()
+
+    else:  # REQUEST_ROUTINE_RESULTS
+        if option:
+            send_negative_response(SERVICE_ID, NRC_INCORRECT_MESSAGE_LENGTH)
+            return
+        if routine is None:
+            send_negative_response(SERVICE_ID, NRC_REQUEST_SEQUENCE_ERROR)
+            return
+        response += routine.results()
+
+    send_isotp(state.response_id, response)
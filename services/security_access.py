@@ -1,11 +1,73 @@
 # UDSIM/services/security_access.py
-from constants import ARB_ID_RESPONSE
+from constants import ARB_ID_REQUEST
 from io_can import send_can_frame
 from services.negative_response import send_negative_response
 from services.secrets_data import FLAG027_1_HEX, FLAG027_2_HEX, FLAG027_3_HEX, FLAG027_4_HEX
 from services.send_flag import send_flag
 import state
-import random
+import clock
+import timers
+
+# Brute-force protection (per tester = request arbitration ID)
+MAX_ATTEMPTS = 3         # invalid keys before NRC 0x36 exceededNumberOfAttempts
+LOCKOUT_DELAY = 10.0     # seconds of NRC 0x37 requiredTimeDelayNotExpired afterwards
+BUCKET_RATE = 10.0       # 0x27 requests per second a tester may sustain
+BUCKET_BURST = 5         # requests a tester may send back-to-back
+
+class _Guard:
+    __slots__ = ("failed", "locked", "tokens", "stamp")
+
+    def __init__(self):
+        self.failed = 0
+        self.locked = False
+        self.tokens = float(BUCKET_BURST)
+        self.stamp = clock.monotonic()
+
+_GUARDS = {}  # tester arbitration ID -> _Guard
+
+def reset_guards():
+    """Forget attempt counters, delays and token buckets of every tester."""
+    _GUARDS.clear()
+
+def _unlock(guard):
+    guard.locked = False
+    guard.failed = 0
+
+def reject_early(tester):
+    """
+    Cheap admission check run by the dispatcher before any logging or seed/key work.
+    Returns True when the request was rejected:
+      - token bucket empty -> dropped silently (flood)
+      - delay timer running -> NRC 0x37, no logging
+    """
+    guard = _GUARDS.get(tester)
+    if guard is None:
+        guard = _GUARDS[tester] = _Guard()
+
+    now = clock.monotonic()
+    guard.tokens = min(BUCKET_BURST, guard.tokens + (now - guard.stamp) * BUCKET_RATE)
+    guard.stamp = now
+    if guard.tokens < 1.0:
+        return True
+    guard.tokens -= 1.0
+
+    if guard.locked:
+        send_can_frame(state.response_id, [0x03, 0x7F, 0x27, 0x37])  # requiredTimeDelayNotExpired
+        return True
+    return False
+
+def _record_invalid_key(tester):
+    """Count a wrong key; returns the NRC to answer with (0x35, or 0x36 when locking out)."""
+    guard = _GUARDS.get(tester)
+    if guard is None:
+        guard = _GUARDS[tester] = _Guard()
+    guard.failed += 1
+    if guard.failed < MAX_ATTEMPTS:
+        return 0x35  # invalidKey
+    guard.locked = True
+    timers.call_later(LOCKOUT_DELAY, _unlock, guard)
+    print(f"[SEC] Tester 0x{tester:X}: {guard.failed} invalid keys -> locked for {LOCKOUT_DELAY:g}s")
+    return 0x36  # exceededNumberOfAttempts
 
 def _params_for_session(sess):
     """Return (mask, nbytes, level_id) based on *session* (not subfunction)."""
@@ -32,8 +94,8 @@ def _pack_be(value, nbytes):
 def _fmt_hex(value, nbytes):  # pretty debug
     return f"0x{value:0{nbytes*2}X}"
 
-def handle_security_access(subfunction, data=None):
-    """SecurityAccess with session-driven seed/key sizes."""
+def handle_security_access(subfunction, data=None, tester=ARB_ID_REQUEST):
+    """SecurityAccess with session-driven seed/key sizes (call reject_early() first)."""
     sess = state.current_session
     print(f"[DEBUG] Security Access subfunction: 0x{subfunction:02X}, Session: 0x{sess:02X}")
 
@@ -53,23 +115,23 @@ def handle_security_access(subfunction, data=None):
         last_seed, prev_seed = _get_last_and_prev(level_id)
 
         if sess == 0x01:
-            seed = random.randint(0, mask) if last_seed == 0 else (last_seed + 0x02) & mask
+            seed = state.rng.randint(0, mask) if last_seed == 0 else (last_seed + 0x02) & mask
             print(f"[SEC][S01] SEED = {_fmt_hex(seed, nbytes)}"
                   + ("" if last_seed == 0 else f"  (prev={_fmt_hex(last_seed, nbytes)} + 0x02)"))
             expected_key = (seed + 0x01) & mask
 
         elif sess == 0x02:
-            seed = random.randint(0, mask)
+            seed = state.rng.randint(0, mask)
             expected_key = state.fixed_key_session02_lvl1 if level_id == 1 else state.fixed_key_session02_lvl2
             print(f"[SEC][S02] SEED = {_fmt_hex(seed, nbytes)}  KEY(expect) = {_fmt_hex(expected_key, nbytes)}")
 
         elif sess == 0x03:
-            seed = random.randint(0, mask)
+            seed = state.rng.randint(0, mask)
             expected_key = (seed ^ ((seed << 1) & mask)) & mask
             print(f"[SEC][S03] SEED = {_fmt_hex(seed, nbytes)}  KEY(expect) = {_fmt_hex(expected_key, nbytes)}")
 
         elif sess == 0x04:
-            seed = random.randint(0, mask)
+            seed = state.rng.randint(0, mask)
             _set_last_and_prev(level_id, prev_val=last_seed)  # keep previous for XOR
             _, prev_now = _get_last_and_prev(level_id)
             expected_key = (seed ^ (prev_now & mask)) & mask
@@ -84,7 +146,7 @@ def handle_security_access(subfunction, data=None):
         key_bytes  = _pack_be(expected_key, nbytes)
         payload_len = 2 + nbytes
         response = [payload_len, 0x67, 0x01] + seed_bytes
-        send_can_frame(ARB_ID_RESPONSE, response)
+        send_can_frame(state.response_id, response)
         print(f"[RESPONSE][DEBUG] 0x67 0x01 SEED={_fmt_hex(seed, nbytes)} KEY={_fmt_hex(expected_key, nbytes)}")
         return
 
@@ -118,6 +180,10 @@ def handle_security_access(subfunction, data=None):
 
     
     if key_value == expected_key:
+        guard = _GUARDS.get(tester)
+        if guard is not None:
+            guard.failed = 0
+
         # Mark authenticated
         state.security_level = 0x01
         if sess in (0x01, 0x02, 0x03, 0x04):
@@ -136,10 +202,10 @@ def handle_security_access(subfunction, data=None):
             send_flag(FLAG027_4_HEX)
 
         # Positive response to sendKey
-        send_can_frame(ARB_ID_RESPONSE, [0x02, 0x67, subfunction])
+        send_can_frame(state.response_id, [0x02, 0x67, subfunction])
         print(f"[SEC] Authenticated 0x10{sess:02X} → security access level = 0x{state.security_granted_level:02X}")
         return
     
     else:
-        send_negative_response(0x27, 0x35)
+        send_negative_response(0x27, _record_invalid_key(tester))
         print("[RESPONSE] Invalid key")
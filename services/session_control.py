@@ -1,8 +1,39 @@
 # UDSIM/services/session_control.py
-from constants import ARB_ID_RESPONSE
+from constants import P2_SERVER_MS, P2_STAR_SERVER_MS, S3_SERVER_MS
 from io_can import send_can_frame
 from services.negative_response import send_negative_response
 import state
+import timers
+
+DEFAULT_SESSION = 0x01
+
+def _reset_security():
+    state.security_level = 0x00
+    state.security_granted_level = 0x00
+
+def _s3_expired(conn):
+    """S3_server elapsed without a request: fall back to the default session."""
+    state.activate(conn)
+    state.s3_timer = None
+    if state.current_session == DEFAULT_SESSION:
+        return
+    print(f"[S3] {conn}: no request for {S3_SERVER_MS} ms in session 0x{state.current_session:02X} "
+          f"-> back to default session")
+    state.current_session = DEFAULT_SESSION
+    _reset_security()
+
+def restart_s3():
+    """(Re)start S3_server after a request; only runs while a non-default session is active."""
+    if state.current_session == DEFAULT_SESSION:
+        if state.s3_timer is not None:
+            state.s3_timer.cancel()
+            state.s3_timer = None
+        return
+
+    if state.s3_timer is None:
+        state.s3_timer = timers.call_later(S3_SERVER_MS / 1000.0, _s3_expired, state.current())
+    else:
+        state.s3_timer.restart(S3_SERVER_MS / 1000.0)
 
 def handle_session_control(session_type):
     """Handle UDS Diagnostic Session Control service and send appropriate response"""
@@ -12,9 +43,9 @@ def handle_session_control(session_type):
         # Update the current session
         state.current_session = session_type
 
-        # P2_server and P2*_server timing parameters (in milliseconds)
-        p2_server = 50
-        p2_star_server = 5000
+        # P2_server in 1 ms resolution, P2*_server in 10 ms resolution (ISO 14229-1)
+        p2_server = P2_SERVER_MS
+        p2_star_server = P2_STAR_SERVER_MS // 10
 
         # [length, positive SID, session type, P2 hi, P2 lo, P2* hi, P2* lo]
         response_data = [0x06, 0x50, session_type,
@@ -22,13 +53,12 @@ def handle_session_control(session_type):
                          (p2_star_server >> 8) & 0xFF, p2_star_server & 0xFF]
         
 
-        send_can_frame(ARB_ID_RESPONSE, response_data)
+        send_can_frame(state.response_id, response_data)
         print(f"[RESPONSE] Changed to session type: 0x{session_type:02X}")
 
         # Reset security level when changing sessions (as per ISO 14229-1)
         if state.security_level != 0x00:
-            state.security_level = 0x00
-            state.security_granted_level = 0x00  
+            _reset_security()
             print("[INFO] Security access reset due to session change")
     else:
         print(f"[WARNING] Invalid session type: 0x{session_type:02X}")
@@ -0,0 +1,17 @@
+# UDSIM/services/tester_present.py
+from io_can import send_can_frame
+from services.negative_response import send_negative_response
+import state
+
+def handle_tester_present(subfunction):
+    """
+    UDS 0x3E TesterPresent.
+      - Request: SID(0x3E) + zeroSubFunction (0x00, or 0x80 to suppress the response)
+      - Positive response: 0x7E 0x00
+    The dispatcher strips/handles the suppressPosRsp bit and restarts S3 for every request.
+    """
+    if (subfunction & 0x7F) != 0x00:
+        send_negative_response(0x3E, 0x12)  # SubFunctionNotSupported
+        return
+
+    send_can_frame(state.response_id, [0x02, 0x7E, 0x00])
@@ -0,0 +1,64 @@
+# UDSIM/services/write_memory_by_address.py
+from __future__ import annotations
+
+from isotp import send_isotp
+from services.negative_response import send_negative_response
+from services.memstore import write_bytes, written_pages
+import state
+
+# NRC constants
+NRC_INCORRECT_MESSAGE_LENGTH = 0x13
+NRC_REQUEST_OUT_OF_RANGE     = 0x31
+NRC_SECURITY_ACCESS_DENIED   = 0x33
+
+SERVICE_ID   = 0x3D
+POS_RESP_SID = 0x7D
+
+def handle_write_memory_by_address(params: list[int]) -> None:
+    """
+    params: UDS payload bytes AFTER the service id (i.e., starts with ALFID).
+            Example: for request "3D 12 F0 00 02 AA BB", params == [0x12, 0xF0, 0x00, 0x02, 0xAA, 0xBB].
+    Writes go to a copy-on-write overlay of the memory image (see memstore) and
+    are dropped again by any ECUReset.
+    Positive response: 0x7D + ALFID + memoryAddress + memorySize.
+    """
+    # Security gate: same level as ReadMemoryByAddress
+    if getattr(state, "security_granted_level", 0) != 0x04:
+        send_negative_response(SERVICE_ID, NRC_SECURITY_ACCESS_DENIED)
+        return
+
+    if not params:
+        send_negative_response(SERVICE_ID, NRC_INCORRECT_MESSAGE_LENGTH)
+        return
+
+    alfid = params[0] & 0xFF
+    size_len = (alfid >> 4) & 0x0F   # HIGH nibble = memorySize length in BYTES
+    addr_len = alfid & 0x0F          # LOW  nibble = memoryAddress length in BYTES
+
+    if size_len == 0 or addr_len == 0:
+        send_negative_response(SERVICE_ID, NRC_INCORRECT_MESSAGE_LENGTH)
+        return
+
+    header_len = 1 + addr_len + size_len
+    if len(params) <= header_len:
+        send_negative_response(SERVICE_ID, NRC_INCORRECT_MESSAGE_LENGTH)
+        return
+
+    # Decode address and size (big-endian)
+    address = int.from_bytes(bytes(params[1:1 + addr_len]), "big")
+    size = int.from_bytes(bytes(params[1 + addr_len:header_len]), "big")
+
+    data = params[header_len:]
+    if size == 0:
+        send_negative_response(SERVICE_ID, NRC_REQUEST_OUT_OF_RANGE)
+        return
+    if len(data) != size:
+        send_negative_response(SERVICE_ID, NRC_INCORRECT_MESSAGE_LENGTH)
+        return
+
+    write_bytes(address, data)
+
+    # Echo ALFID, address and size
+    send_isotp(state.response_id, [POS_RESP_SID] + params[:header_len])
+    print(f"[0x3D] addr=0x{address:0{addr_len * 2}X} size={size} -> written "
+          f"({written_pages()} page(s) modified since reset)")
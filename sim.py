@@ -0,0 +1,99 @@
+# UDSIM/sim.py
+# In-process simulator on virtual time, for scripted tests:
+#
+#   sim = Simulation(seed=1)
+#   sim.request([0x10, 0x03])           # -> [(0x7E8, b'\x06\x50\x03...')]
+#   sim.advance(6.0)                     # S3 expires without waiting 6 s
+#   sim.request([0x11, 0x01])            # reset delay costs no wall time
+#
+# Frames go to a loopback transport, timers/delays run on the virtual clock
+# (clock.use_virtual) and every random source is seeded, so the same script
+# gives the same frames, instantly.
+import contextlib
+import os
+from typing import List, NamedTuple, Sequence, Tuple
+
+import clock
+import dispatcher
+import io_can
+import state
+import timers
+from constants import ARB_ID_REQUEST
+from services import security_access
+from services.dtc_store import reset_dtcs
+from services.memstore import reset_memory
+
+class _Msg(NamedTuple):
+    arbitration_id: int
+    data: bytes
+
+class Simulation:
+    def __init__(self, seed: int = 0, verbose: bool = False):
+        self.clock = clock.use_virtual()
+        self.loopback = io_can.LoopbackTransport()
+        io_can.set_transport(self.loopback)
+        self._devnull = open(os.devnull, "w")
+        self._quiet = (contextlib.nullcontext() if verbose
+                       else contextlib.redirect_stdout(self._devnull))
+        with self._quiet:
+            timers.clear()
+            dispatcher.forget_jobs()
+            state.seed(seed)
+            for conn in state.CONNECTIONS.values():
+                conn.reset()
+            state.activate(state.CONNECTIONS[ARB_ID_REQUEST])
+            security_access.reset_guards()
+            reset_memory(seed=seed)
+            reset_dtcs(seed=seed)
+
+    @property
+    def now(self) -> float:
+        """Virtual seconds since the simulation started."""
+        return self.clock.now
+
+    def send(self, arb_id: int, data: Sequence[int]) -> List[Tuple[int, bytes]]:
+        """Deliver one CAN frame; returns the frames sent in response (timers due now included)."""
+        start = len(self.loopback.frames)
+        with self._quiet:
+            dispatcher.handle_can_message(_Msg(arb_id, bytes(data)))
+            timers.advance(0)
+        return self.loopback.frames[start:]
+
+    def request(self, payload: Sequence[int], arb_id: int = ARB_ID_REQUEST) -> List[Tuple[int, bytes]]:
+        """Send a UDS payload (SID first) as SF or FF + CFs; returns the response frames."""
+        payload = bytes(payload)
+        if len(payload) <= 7:
+            return self.send(arb_id, bytes([len(payload)]) + payload)
+        frames = self.send(arb_id, bytes([0x10 | (len(payload) >> 8), len(payload) & 0xFF]) + payload[:6])
+        sn = 1
+        for pos in range(6, len(payload), 7):
+            frames += self.send(arb_id, bytes([0x20 | sn]) + payload[pos:pos + 7])
+            sn = (sn + 1) & 0x0F
+        return frames
+
+    def advance(self, seconds: float) -> List[Tuple[int, bytes]]:
+        """Let 'seconds' of virtual time pass; returns the frames sent meanwhile."""
+        start = len(self.loopback.frames)
+        with self._quiet:
+            timers.advance(seconds)
+        return self.loopback.frames[start:]
+
+    def run_until_idle(self) -> List[Tuple[int, bytes]]:
+        """Fire timers until none is armed (routines, pending jobs, S3)."""
+        start = len(self.loopback.frames)
+        with self._quiet:
+            timers.run_until_idle()
+        return self.loopback.frames[start:]
+
+    def close(self) -> None:
+        """Back to the wall clock and the cansend transport."""
+        timers.clear()
+        io_can.set_transport(None)
+        clock.use_wall()
+        self._devnull.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
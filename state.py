@@ -1,18 +1,111 @@
 # UDSIM/state.py
+#
+# Session/security state lives on a Connection: one per physical request/response
+# ID pair (i.e. per simulated ECU a tester talks to), so several testers never
+# share a session. The dispatcher activates the addressed connection for the
+# current thread before calling a handler, and handlers keep using plain
+# module attributes (`state.current_session = 0x03`): the names listed in
+# PER_CONNECTION resolve to the active connection.
 import random
+import sys
+import threading
+import types
 
-# Global variables to track current session and security status
-current_session = 0x01  # Default to standard session
-security_level = 0x00   # Not authenticated by default
-security_granted_level = 0x00  
+from constants import ARB_ID_REQUEST, ARB_ID_RESPONSE
 
-# Per-auth-level seed tracking:
-# auth 0x01/0x02 -> 1 byte, auth 0x03/0x04 -> 2 bytes
-last_seed_1 = 0      # last seed for auth type 0x01/0x02 (1 byte)
-prev_seed_1 = 0      # previous seed for session 0x04 logic
-last_seed_2 = 0      # last seed for auth type 0x03/0x04 (2 bytes)
-prev_seed_2 = 0      # previous seed for session 0x04 logic
+class Connection:
+    def __init__(self, request_id, response_id):
+        self.request_id = request_id
+        self.response_id = response_id
+        self._power_on()
+
+    def _power_on(self):
+        # Session and security status
+        self.current_session = 0x01  # Default to standard session
+        self.security_level = 0x00   # Not authenticated by default
+        self.security_granted_level = 0x00
+        self.s3_timer = None         # timers.Timer while a non-default session is active
+
+        # Per-auth-level seed tracking:
+        # auth 0x01/0x02 -> 1 byte, auth 0x03/0x04 -> 2 bytes
+        self.last_seed_1 = 0   # last seed for auth type 0x01/0x02 (1 byte)
+        self.prev_seed_1 = 0   # previous seed for session 0x04 logic
+        self.last_seed_2 = 0   # last seed for auth type 0x03/0x04 (2 bytes)
+        self.prev_seed_2 = 0   # previous seed for session 0x04 logic
+
+        # ISO-TP reassembly of multi-frame requests
+        self.rx_buffer = None  # bytearray while a FF/CF sequence is in progress
+        self.rx_length = 0
+        self.rx_sn = 0
+
+        # Addressing of the request being handled
+        self.functional = False        # received on the functional ID (0x7DF)
+        self.suppress_pos_rsp = False  # suppressPosRspMsgIndicationBit was set
+
+        # Copy-on-write memory pages written via 0x3D (page index -> bytearray), see memstore
+        self.mem_pages = {}
+
+        # RoutineControl (0x31): routine ID -> routine started on this connection
+        self.routines = {}
+
+    def reset(self):
+        """ECUReset: back to power-on state; drops written memory pages (O(pages written))."""
+        if self.s3_timer is not None:
+            self.s3_timer.cancel()
+        self._power_on()
+
+    def __repr__(self):
+        return f"Connection(0x{self.request_id:X} -> 0x{self.response_id:X})"
+
+PER_CONNECTION = (
+    "response_id",
+    "current_session", "security_level", "security_granted_level", "s3_timer",
+    "last_seed_1", "prev_seed_1", "last_seed_2", "prev_seed_2",
+    "functional", "suppress_pos_rsp", "mem_pages", "routines",
+)
+
+# Request arbitration ID -> Connection
+CONNECTIONS = {}
+
+def add_connection(request_id, response_id):
+    """Simulate one more ECU endpoint (physical request/response ID pair)."""
+    conn = CONNECTIONS.get(request_id)
+    if conn is None:
+        conn = CONNECTIONS[request_id] = Connection(request_id, response_id)
+    return conn
+
+_default = add_connection(ARB_ID_REQUEST, ARB_ID_RESPONSE)
+_local = threading.local()
+
+def activate(conn):
+    """Make 'conn' the connection handlers on this thread read/write through `state`."""
+    _local.conn = conn
+
+def current():
+    return getattr(_local, "conn", None) or _default
+
+# Random source for seeds/keys; seed() makes a run reproducible
+rng = random.Random()
 
 # Fixed keys for session type 0x02 (constant for the lifetime of the program)
-fixed_key_session02_lvl1 = random.randint(0x00, 0xFF)      # 1 byte key
-fixed_key_session02_lvl2 = random.randint(0x0000, 0xFFFF)  # 2 byte key
+fixed_key_session02_lvl1 = rng.randint(0x00, 0xFF)      # 1 byte key
+fixed_key_session02_lvl2 = rng.randint(0x0000, 0xFFFF)  # 2 byte key
+
+def seed(value):
+    """Reseed the seed/key generator and redraw the fixed session 0x02 keys."""
+    global fixed_key_session02_lvl1, fixed_key_session02_lvl2
+    rng.seed(value)
+    fixed_key_session02_lvl1 = rng.randint(0x00, 0xFF)
+    fixed_key_session02_lvl2 = rng.randint(0x0000, 0xFFFF)
+
+class _StateModule(types.ModuleType):
+    pass
+
+def _forward(name):
+    return property(lambda self: getattr(current(), name),
+                    lambda self, value: setattr(current(), name, value))
+
+for _name in PER_CONNECTION:
+    setattr(_StateModule, _name, _forward(_name))
+
+sys.modules[__name__].__class__ = _StateModule
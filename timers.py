@@ -0,0 +1,146 @@
+# UDSIM/timers.py
+# Single timer queue shared by every timed behaviour of the simulator
+# (S3 session timeouts, delays, ...). It is a binary heap keyed by deadline,
+# so arming a timer is O(log n) and finding the next deadline is O(1) no
+# matter how many testers/ECUs are being simulated.
+#
+# Restarting a running timer (e.g. S3 on every request) does not touch the
+# heap: only the deadline stored on the Timer moves. When the stale heap entry
+# pops, the timer is simply pushed again with its new deadline.
+#
+# The heap belongs to the main loop. Worker threads hand work over with
+# call_soon_threadsafe(); it runs at the start of the next run_due().
+import heapq
+import itertools
+import queue
+from typing import Callable, List, Optional, Tuple
+
+import clock
+import state
+
+class Timer:
+    """Handle returned by call_later(); use cancel() / restart()."""
+    __slots__ = ("deadline", "callback", "args", "cancelled", "_queued_at")
+
+    def __init__(self, deadline: float, callback: Callable, args: tuple):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+        self._queued_at = deadline
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+    def restart(self, delay: float) -> None:
+        """Move the deadline to now + delay (re-arms a cancelled/fired timer)."""
+        self.deadline = clock.monotonic() + delay
+        if self.cancelled or self.deadline < self._queued_at:
+            # Not in the heap anymore, or needs to fire earlier than the queued entry
+            self.cancelled = False
+            _push(self)
+
+_heap: List[Tuple[float, int, Timer]] = []
+_seq = itertools.count()
+_handoff: "queue.SimpleQueue[Tuple[Callable, tuple]]" = queue.SimpleQueue()
+
+def _push(timer: Timer) -> None:
+    timer._queued_at = timer.deadline
+    heapq.heappush(_heap, (timer.deadline, next(_seq), timer))
+
+def call_later(delay: float, callback: Callable, *args) -> Timer:
+    """Run callback(*args) from the main loop once 'delay' seconds have passed."""
+    timer = Timer(clock.monotonic() + delay, callback, args)
+    _push(timer)
+    return timer
+
+def call_soon_threadsafe(callback: Callable, *args) -> None:
+    """From any thread: run callback(*args) on the main loop at its next run_due()."""
+    _handoff.put((callback, args))
+
+def _run_handoff() -> int:
+    fired = 0
+    while True:
+        try:
+            callback, args = _handoff.get_nowait()
+        except queue.Empty:
+            return fired
+        callback(*args)
+        fired += 1
+
+def _drop_stale_head() -> None:
+    """Discard cancelled/outdated entries sitting at the top of the heap."""
+    while _heap:
+        queued_at, _, timer = _heap[0]
+        if timer.cancelled or queued_at != timer._queued_at:
+            heapq.heappop(_heap)
+        elif timer.deadline > queued_at:
+            # Restarted since it was queued: requeue with the new deadline
+            heapq.heappop(_heap)
+            _push(timer)
+        else:
+            return
+
+def next_timeout(default: Optional[float] = None) -> Optional[float]:
+    """Seconds until the next timer is due (capped by 'default'), 0 if overdue."""
+    if not _handoff.empty():
+        return 0.0
+    _drop_stale_head()
+    if not _heap:
+        return default
+    wait = max(0.0, _heap[0][0] - clock.monotonic())
+    return wait if default is None else min(wait, default)
+
+def run_due() -> int:
+    """Fire every timer whose deadline has passed. Returns the number fired."""
+    fired = _run_handoff()
+    now = clock.monotonic()
+    while True:
+        _drop_stale_head()
+        if not _heap or _heap[0][0] > now:
+            return fired
+        _, _, timer = heapq.heappop(_heap)
+        timer.cancelled = True  # one-shot; restart() re-arms it
+        timer.callback(*timer.args)
+        fired += 1
+
+def advance(seconds: float) -> int:
+    """
+    Virtual time: move the clock forward by 'seconds', firing every timer that
+    falls due on the way at its own deadline, in deadline order.
+    """
+    virtual = clock.current()
+    if not virtual.virtual:
+        raise RuntimeError("timers.advance() needs the virtual clock (clock.use_virtual())")
+    target = virtual.now + seconds
+    active = state.current()  # a callback may activate another connection
+    fired = 0
+    while True:
+        fired += _run_handoff()
+        _drop_stale_head()
+        if not _heap or _heap[0][0] > target:
+            break
+        deadline, _, timer = heapq.heappop(_heap)
+        virtual.now = max(virtual.now, deadline)
+        timer.cancelled = True
+        timer.callback(*timer.args)
+        fired += 1
+    virtual.now = max(virtual.now, target)
+    state.activate(active)
+    return fired
+
+def run_until_idle(limit: float = 3600.0) -> int:
+    """Virtual time: fire timers in order until none is left (or 'limit' seconds passed)."""
+    fired = 0
+    end = clock.monotonic() + limit
+    while True:
+        wait = next_timeout()
+        if wait is None or clock.monotonic() + wait > end:
+            return fired
+        fired += advance(wait)
+
+def clear() -> None:
+    """Forget every armed timer (and work handed over by other threads)."""
+    _heap.clear()
+    while not _handoff.empty():
+        _handoff.get_nowait()